@@ -1,131 +1,953 @@
 """
 Handling the AI moves.
 """
+import argparse
+import array
+import json
+import mmap
+import multiprocessing
+import os
 import random
+import sys
+import tempfile
+import time
 
-piece_score = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-
-knight_scores = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
-                 [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
-                 [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
-                 [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
-                 [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
-                 [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
-                 [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
-                 [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
-
-bishop_scores = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
-                 [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                 [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
-                 [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
-                 [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
-                 [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
-                 [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
-                 [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
-
-rook_scores = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
-               [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
-
-queen_scores = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
-                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
-
-pawn_scores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
-               [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
-               [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
-               [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
-               [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
-               [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
-               [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
-               [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
-
-piece_position_scores = {"wN": knight_scores,
-                         "bN": knight_scores[::-1],
-                         "wB": bishop_scores,
-                         "bB": bishop_scores[::-1],
-                         "wQ": queen_scores,
-                         "bQ": queen_scores[::-1],
-                         "wR": rook_scores,
-                         "bR": rook_scores[::-1],
-                         "wp": pawn_scores,
-                         "bp": pawn_scores[::-1]}
-
-CHECKMATE = 1000
+import ChessBook
+import ChessEngine
+import ChessGenerators
+import ChessPerft
+import ChessTablebase
+
+CHECKMATE = 100000  # scores are in centipawns, a mate scores CHECKMATE less the plies from the root to it
+MATE_BOUND = CHECKMATE - 1000  # scores beyond this are mates
 STALEMATE = 0
-DEPTH = 3
-
-
-def findBestMove(game_state, valid_moves, return_queue):
-    global next_move
-    next_move = None
-    random.shuffle(valid_moves)
-    findMoveNegaMaxAlphaBeta(game_state, valid_moves, DEPTH, -CHECKMATE, CHECKMATE,
-                             1 if game_state.white_to_move else -1)
-    return_queue.put(next_move)
-
-
-def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_move
-    if depth == 0:
-        return turn_multiplier * scoreBoard(game_state)
-    # move ordering - implement later //TODO
-    max_score = -CHECKMATE
-    for move in valid_moves:
-        game_state.makeMove(move)
-        next_moves = game_state.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
-        if score > max_score:
-            max_score = score
-            if depth == DEPTH:
-                next_move = move
-        game_state.undoMove()
-        if max_score > alpha:
-            alpha = max_score
-        if alpha >= beta:
-            break
-    return max_score
-
-
-def scoreBoard(game_state):
+MAX_DEPTH = 64  # iterative deepening stops here even if there is time left
+MOVE_TIME = 1.0  # seconds per move when no clock is given
+MOVES_TO_GO = 30  # the clock time left is spread over this many moves
+TIME_CHECK_NODES = 1024  # nodes between looks at the clock
+INFINITE_SCORE = CHECKMATE + 1  # outside every real score, for the bounds of a full window
+ASPIRATION_WINDOW = 50  # centipawns either side of the last iteration's score, 0 searches every iteration fully
+HASH_SIZE_MB = 16
+GENERATOR = "ChessEngine"  # name of the ChessGenerators move generator the search runs on
+TABLEBASE_DIRECTORY = ChessTablebase.TABLEBASE_DIRECTORY  # None searches without the endgame tables
+TABLEBASE_WIN = CHECKMATE // 2  # minus the plies to the mate, below a mate the search found itself
+TABLEBASE_BOUND = TABLEBASE_WIN - 1000  # scores beyond this are tablebase wins or mates
+SHARED_DIRECTORY = "/dev/shm" if os.path.isdir("/dev/shm") else None  # where shared tables live, in memory on Linux
+
+# move ordering scores, a move is searched earlier the higher it scores
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28  # plus the MVV-LVA score, so captures come before the killers and quiet moves
+KILLER_SCORES = (1 << 27, (1 << 27) - 1)  # first and second killer slot
+# most valuable victim, least valuable attacker: by piece type code, pawn 1 up to king 6
+MVV_LVA = [[victim * 8 - attacker for attacker in range(8)] for victim in range(8)]
+
+# material value by piece type code, for pruning captures in the quiescence search
+PIECE_VALUES = [0] * 8
+for piece_name, piece_code in ChessEngine.PIECE_CODES.items():
+    if piece_name != "--":
+        PIECE_VALUES[piece_code & ChessEngine.PIECE_TYPE_MASK] = ChessEngine.PIECE_SCORES[piece_name[1]]
+DELTA_MARGIN = 200  # a capture that cannot bring the score this close to alpha is not searched
+
+# selective search, each technique can be switched off on its own
+NULL_MOVE_PRUNING = True
+NULL_MOVE_REDUCTION = 2  # the null move is searched this many plies shallower, besides the ply it uses itself
+NULL_MOVE_MIN_DEPTH = 3
+LATE_MOVE_REDUCTIONS = True
+LATE_MOVE_MIN_DEPTH = 3
+LATE_MOVE_MIN_NUMBER = 3  # moves searched before the first reduction
+FUTILITY_PRUNING = True
+FUTILITY_MARGINS = (0, 200, 500)  # by remaining depth, quiet moves at depth 1 and 2 are pruned when the static
+RAZORING = True                   # score plus the margin cannot reach alpha
+RAZOR_MARGINS = (0, 300, 500)  # by remaining depth, hopeless nodes at depth 1 and 2 drop into the quiescence search
+
+# transposition table entry types
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high, the score is at least this
+UPPER_BOUND = 2  # the search failed low, the score is at most this
+
+# transposition table slot data, from the low bits up: depth, flag, age, score + offset, move
+SLOT_DEPTH_MASK = 0xFF
+SLOT_FLAG_SHIFT = 8
+SLOT_FLAG_MASK = 0x3
+SLOT_AGE_SHIFT = 10
+SLOT_AGE_MASK = 0xFF
+SLOT_SCORE_SHIFT = 18
+SLOT_SCORE_MASK = 0xFFFFF
+SLOT_SCORE_OFFSET = 1 << 19  # scores are stored unsigned
+SLOT_MOVE_SHIFT = 38  # 26 bits of packed move
+
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of searched positions, indexed by the low bits of the zobrist key.
+    Each slot keeps one entry and a new entry only replaces a deeper one if that one is from an older search.
+    A slot is two 64 bit words in an array, the key xor the data and the data (see the SLOT_ constants),
+    so the table takes exactly its size in memory and no Python objects are kept per entry.
+    """
+    ENTRY_SIZE = 16  # bytes per slot, two 64 bit words
+
+    def __init__(self, size_mb=HASH_SIZE_MB):
+        self.size_mb = size_mb
+        entries = max(1, size_mb * 1024 * 1024 // self.ENTRY_SIZE)
+        self.size = 1 << (entries.bit_length() - 1)  # round down to a power of two so the index is a mask
+        self.mask = self.size - 1
+        self.slots = array.array("Q", bytes(self.size * self.ENTRY_SIZE))
+        self.age = 0
+        self.resetStats()
+
+    def clear(self):
+        self.__init__(self.size_mb)
+
+    def resetStats(self):
+        self.probes = self.hits = self.collisions = self.stores = 0
+
+    def newSearch(self):
+        """
+        Mark the entries stored so far as old, so they can be replaced by shallower ones.
+        """
+        self.age = (self.age + 1) & SLOT_AGE_MASK
+
+    def probe(self, key):
+        """
+        Return (depth, flag, score, move) stored for the position, or None.
+        """
+        self.probes += 1
+        index = (key & self.mask) << 1
+        data = self.slots[index + 1]
+        stored_key = self.slots[index] ^ data
+        if stored_key == key:
+            self.hits += 1
+            move = data >> SLOT_MOVE_SHIFT
+            return data & SLOT_DEPTH_MASK, data >> SLOT_FLAG_SHIFT & SLOT_FLAG_MASK, \
+                (data >> SLOT_SCORE_SHIFT & SLOT_SCORE_MASK) - SLOT_SCORE_OFFSET, move or None
+        if data:
+            self.collisions += 1  # the slot holds a different position
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        index = (key & self.mask) << 1
+        data = self.slots[index + 1]
+        if data and self.slots[index] ^ data != key and depth < data & SLOT_DEPTH_MASK and \
+                data >> SLOT_AGE_SHIFT & SLOT_AGE_MASK == self.age:
+            return  # keep the deeper entry of the current search
+        self.stores += 1
+        data = depth | flag << SLOT_FLAG_SHIFT | self.age << SLOT_AGE_SHIFT | \
+            (score + SLOT_SCORE_OFFSET) << SLOT_SCORE_SHIFT | (move or 0) << SLOT_MOVE_SHIFT
+        self.slots[index] = key ^ data
+        self.slots[index + 1] = data
+
+    def getStats(self):
+        """
+        Usage counters of this process, the rates are relative to the number of probes.
+        """
+        return {"size": self.size,
+                "probes": self.probes,
+                "hits": self.hits,
+                "collisions": self.collisions,
+                "stores": self.stores,
+                "hit_rate": self.hits / self.probes if self.probes else 0.0,
+                "collision_rate": self.collisions / self.probes if self.probes else 0.0}
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    Transposition table in a memory-mapped file, so several processes can probe and store into the same one.
+    The slots are laid out as in TranspositionTable, and there are no locks: a slot written by two processes
+    at once ends up with a key that does not check out against its data, and reads as empty.
+    Pickling it, to pass it to another process, maps the same file in the other process and carries the age
+    along, so the process that passes it on calls newSearch once per move and the workers start from that age.
+    The process that created it should call unlink when no process needs it any more.
+    """
+
+    def __init__(self, size_mb=HASH_SIZE_MB, path=None, age=0):
+        self.size_mb = size_mb
+        entries = max(1, size_mb * 1024 * 1024 // self.ENTRY_SIZE)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.owner = path is None
+        if self.owner:
+            descriptor, self.path = tempfile.mkstemp(prefix="chess-hash-", dir=SHARED_DIRECTORY)
+            os.ftruncate(descriptor, self.size * self.ENTRY_SIZE)
+        else:
+            self.path = path
+            descriptor = os.open(path, os.O_RDWR)
+        self.memory = mmap.mmap(descriptor, self.size * self.ENTRY_SIZE)
+        os.close(descriptor)
+        self.slots = memoryview(self.memory).cast("Q")
+        self.age = age
+        self.resetStats()
+
+    def __reduce__(self):
+        return self.__class__, (self.size_mb, self.path, self.age)
+
+    def clear(self):
+        self.memory[:] = bytes(self.size * self.ENTRY_SIZE)
+        self.age = 0
+        self.resetStats()
+
+    def close(self):
+        self.slots.release()
+        self.memory.close()
+
+    def unlink(self):
+        self.close()
+        os.unlink(self.path)
+
+
+transposition_table = None  # the table of findBestMove in this process, made on first use by getTranspositionTable
+
+
+def getTranspositionTable():
+    """
+    The table findBestMove keeps from one move to the next, made the first time it is needed so the processes
+    that import this module without searching do not allocate one.
+    """
+    global transposition_table
+    if transposition_table is None:
+        transposition_table = TranspositionTable()
+    return transposition_table
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time is up or a stop was requested.
+    """
+
+
+def getMoveTime(time_left=None, increment=0.0, move_time=MOVE_TIME):
+    """
+    Seconds to spend on a move: move_time without a clock, otherwise a share of the clock time left plus most of
+    the increment, never more than half of what is left.
+    """
+    if time_left is None:
+        return move_time
+    return max(0.01, min(time_left / 2, time_left / MOVES_TO_GO + increment * 0.8))
+
+
+class Searcher:
+    """
+    One search with its own state, so several can run in a process or thread pool.
+    Principal variation search with iterative deepening, aspiration windows, a transposition table,
+    move ordering, selective pruning and a quiescence search at the leaves.
+    Positions in the endgame tables of ChessTablebase are looked up instead of searched, the root as well.
+    """
+
+    def __init__(self, table=None, stats_path=None):
+        self.transposition_table = table if table is not None else TranspositionTable()
+        self.stats_path = stats_path  # JSON-lines file every search appends its stats to, see writeStats
+        self.start_time = 0.0
+        self.deadline = 0.0
+        self.soft_deadline = 0.0  # no new iteration is started after this
+        self.stop_event = None
+        self.killer_moves = []  # two quiet moves per ply that caused a cutoff
+        self.history_scores = [0] * (16 * 64)  # by piece code * 64 + end square, how often a quiet move cut off
+        self.pv_table = []  # pv_table[ply] is the best line found from ply on
+        self.principal_variation = []  # best line of the last finished iteration
+        self.root_move = None  # best root move found so far in the current iteration
+        self.tablebases = None
+        self.resetStats()
+
+    def resetStats(self):
+        """
+        Zero the counters of getStats, also the transposition table's, which count from one search to the next.
+        """
+        self.depth = 0
+        self.nodes = 0
+        self.qnodes = 0  # of the nodes, the ones in the quiescence search
+        self.seconds = 0.0
+        self.iterations = []  # depth, nodes and seconds of every iteration that finished
+        self.cutoffs = 0  # nodes where a move failed high
+        self.first_move_cutoffs = 0  # of those, nodes where it was the first move searched
+        self.null_move_tries = 0
+        self.null_move_cutoffs = 0
+        self.late_move_reductions = 0
+        self.late_move_researches = 0  # reduced moves that beat alpha and were searched again at full depth
+        self.pvs_researches = 0  # zero window searches that landed inside the window and were searched again
+        self.aspiration_researches = 0  # iterations searched again because the score fell outside the window
+        self.futility_pruned = 0
+        self.razor_cutoffs = 0
+        self.tablebase_hits = 0
+        self.repetition_draws = 0  # nodes scored as a draw by repetition or the fifty-move rule
+        self.transposition_table.resetStats()
+
+    def getStats(self):
+        """
+        Counters of the last search and the rates of addRates, a good move ordering makes most cutoffs happen
+        on the first move.
+        """
+        stats = {"depth": self.depth,
+                 "nodes": self.nodes,
+                 "qnodes": self.qnodes,
+                 "seconds": round(self.seconds, 4),
+                 "iterations": self.iterations,
+                 "cutoffs": self.cutoffs,
+                 "first_move_cutoffs": self.first_move_cutoffs,
+                 "null_move_tries": self.null_move_tries,
+                 "null_move_cutoffs": self.null_move_cutoffs,
+                 "late_move_reductions": self.late_move_reductions,
+                 "late_move_researches": self.late_move_researches,
+                 "pvs_researches": self.pvs_researches,
+                 "aspiration_researches": self.aspiration_researches,
+                 "futility_pruned": self.futility_pruned,
+                 "razor_cutoffs": self.razor_cutoffs,
+                 "tablebase_hits": self.tablebase_hits,
+                 "repetition_draws": self.repetition_draws,
+                 "transposition_table": self.transposition_table.getStats()}
+        return addRates(stats)
+
+    def search(self, game_state, valid_moves=None, move_time=MOVE_TIME, time_left=None, increment=0.0,
+               max_depth=MAX_DEPTH, stop_event=None, report=None):
+        """
+        Search one ply deeper at a time until the time for the move is used up or stop_event is set.
+        Returns a dict with the best move, its score for the side to move, the depth, the principal variation,
+        the node count and the seconds taken, all from the deepest iteration that finished, the best move
+        and score of every iteration and the getStats of the search. valid_moves can be a part of the legal moves,
+        to search only those. report, if given, is called with the result so far after every iteration.
+        The game state is back in its starting position afterwards.
+        """
+        start_time = self.start_time = time.perf_counter()
+        self.setBudget(getMoveTime(time_left, increment, move_time))
+        self.stop_event = stop_event
+        self.resetStats()
+        self.killer_moves = [[None, None] for _ in range(max_depth + 1)]
+        self.history_scores = [0] * (16 * 64)
+        self.pv_table = [[] for _ in range(max_depth + 2)]
+        self.principal_variation = []
+        self.transposition_table.newSearch()
+        legal_moves = game_state.getValidMoves()  # also sets in_check of the root, which the search reads
+        if valid_moves is None:
+            valid_moves = legal_moves
+        self.tablebases = ChessTablebase.openTablebases(TABLEBASE_DIRECTORY)
+        solved = self.tablebases.getBestMove(game_state, valid_moves) if valid_moves else None
+        if solved is not None:
+            move, outcome, plies = solved
+            score = outcome * (TABLEBASE_WIN - plies)
+            result = {"move": move, "score": score, "depth": 0, "pv": [move], "nodes": 0,
+                      "iterations": [{"depth": 0, "move": move, "score": score}], "tablebase": True}
+            self.finishSearch(game_state, result)
+            if report is not None:
+                report(result)
+            return result
+        turn_multiplier = 1 if game_state.white_to_move else -1
+        root_length = len(game_state.move_log)
+        result = {"move": valid_moves[0] if valid_moves else None, "score": 0, "depth": 0, "pv": [], "nodes": 0}
+        iterations = []
+        score = 0
+        for depth in range(1, max_depth + 1):
+            self.depth = depth
+            iteration_start = time.perf_counter()
+            iteration_nodes = self.nodes
+            window = ASPIRATION_WINDOW if depth > 1 else 0
+            alpha = score - window if window else -INFINITE_SCORE
+            beta = score + window if window else INFINITE_SCORE
+            try:
+                while True:
+                    self.root_move = None
+                    score = self.findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta, turn_multiplier)
+                    if score <= alpha:  # failed low, widen the window downwards and search again
+                        window *= 4
+                        alpha = max(score - window, -INFINITE_SCORE)
+                    elif score >= beta:
+                        window *= 4
+                        beta = min(score + window, INFINITE_SCORE)
+                    else:
+                        break
+                    self.aspiration_researches += 1
+            except SearchTimeout:
+                # put the game state back the way it came in
+                while len(game_state.move_log) > root_length:
+                    if game_state.move_log[-1] == ChessEngine.NULL_MOVE:
+                        game_state.undoNullMove()
+                    else:
+                        game_state.undoMove()
+                break
+            self.principal_variation = self.pv_table[0]
+            result = {"move": self.root_move if self.root_move is not None else result["move"],
+                      "score": score,
+                      "depth": depth,
+                      "pv": list(self.principal_variation),
+                      "nodes": self.nodes}
+            iterations.append({"depth": depth, "move": result["move"], "score": score})
+            self.iterations.append({"depth": depth, "nodes": self.nodes - iteration_nodes,
+                                    "seconds": round(time.perf_counter() - iteration_start, 4)})
+            if report is not None:
+                result["seconds"] = time.perf_counter() - start_time
+                report(result)
+            if abs(score) >= MATE_BOUND or len(legal_moves) == 1:
+                break  # a forced mate or a forced move will not change with more depth
+            if time.perf_counter() > self.soft_deadline:
+                break  # the next iteration takes several times longer, it would not finish
+        result["iterations"] = iterations
+        self.finishSearch(game_state, result)
+        return result
+
+    def finishSearch(self, game_state, result):
+        """
+        Add the time taken and the stats to the result of a search, and write them to stats_path if there is one.
+        """
+        self.seconds = result["seconds"] = time.perf_counter() - self.start_time
+        result["stats"] = self.getStats()
+        if self.stats_path is not None:
+            writeStats(self.stats_path, result, game_state.getFen())
+
+    def setBudget(self, budget):
+        """
+        Give the search budget seconds from its start, also while it runs: a ponder search runs without a limit
+        until the move it ponders on is played, and then gets the time for the move.
+        """
+        self.deadline = self.start_time + budget
+        self.soft_deadline = self.start_time + budget / 2
+
+    def countNode(self):
+        """
+        Count a searched node, and every TIME_CHECK_NODES nodes stop the search if the time is up.
+        """
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_NODES == 0:
+            if time.perf_counter() > self.deadline or (self.stop_event is not None and self.stop_event.is_set()):
+                raise SearchTimeout()
+
+    def orderMoves(self, moves, hash_move, ply):
+        """
+        Sort the moves so the ones most likely to cause a cutoff are searched first: the hash move,
+        captures by MVV-LVA, the two killers of this ply and then the quiet moves by their history score.
+        """
+        killers = self.killer_moves[ply]
+        history = self.history_scores
+
+        def scoreMove(move):
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            captured = move >> ChessEngine.CAPTURED_SHIFT & ChessEngine.PIECE_TYPE_MASK
+            if captured or move & ChessEngine.PROMOTION_MASK:
+                # a promotion counts as capturing the piece it promotes to
+                victim = captured or move >> ChessEngine.PROMOTION_SHIFT & ChessEngine.PIECE_TYPE_MASK
+                return CAPTURE_SCORE + MVV_LVA[victim][move >> ChessEngine.MOVED_SHIFT & ChessEngine.PIECE_TYPE_MASK]
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+            return history[(move >> ChessEngine.MOVED_SHIFT & ChessEngine.PIECE_MASK) << 6 |
+                           move >> ChessEngine.END_SHIFT & ChessEngine.SQUARE_MASK]
+
+        moves.sort(key=scoreMove, reverse=True)
+
+    def storeCutoff(self, move, depth, ply):
+        """
+        Remember a quiet move that failed high as a killer for its ply and in the history table.
+        """
+        if move & ChessEngine.CAPTURE_OR_PROMOTION_MASK:
+            return  # captures and promotions are already ordered first
+        killers = self.killer_moves[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history_scores[(move >> ChessEngine.MOVED_SHIFT & ChessEngine.PIECE_MASK) << 6 |
+                            move >> ChessEngine.END_SHIFT & ChessEngine.SQUARE_MASK] += depth * depth
+
+    def quiescenceSearch(self, game_state, alpha, beta, turn_multiplier, ply):
+        """
+        Search only captures and promotions below the full-width search, so no leaf is scored in the middle
+        of an exchange. The side to move may also stand pat: take the static score instead of capturing.
+        In check there is no standing pat and every way out of check is searched.
+        Out of check, captures that cannot raise the score to alpha (delta pruning) and captures of a defended
+        piece by a more valuable one are skipped.
+        """
+        self.countNode()
+        self.qnodes += 1
+        in_check = game_state.inCheck()
+        if in_check:
+            max_score = stand_pat = ply - CHECKMATE
+        else:
+            max_score = stand_pat = turn_multiplier * game_state.score
+            if max_score >= beta:
+                return max_score
+            if max_score > alpha:
+                alpha = max_score
+        moves = game_state.getCaptureMoves()
+        if in_check and not moves:
+            return turn_multiplier * scoreBoard(game_state, ply)  # checkmate
+        orderCaptures(moves)
+        for move in moves:
+            if not in_check:
+                gain = PIECE_VALUES[move >> ChessEngine.CAPTURED_SHIFT & ChessEngine.PIECE_TYPE_MASK]
+                if move & ChessEngine.PROMOTION_MASK:
+                    gain += PIECE_VALUES[move >> ChessEngine.PROMOTION_SHIFT & ChessEngine.PIECE_TYPE_MASK] - \
+                            PIECE_VALUES[ChessEngine.PAWN]
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+                end_square = move >> ChessEngine.END_SHIFT & ChessEngine.SQUARE_MASK
+                if PIECE_VALUES[move >> ChessEngine.MOVED_SHIFT & ChessEngine.PIECE_TYPE_MASK] > gain and \
+                        game_state.squareUnderAttack(end_square >> 3, end_square & 7):
+                    continue
+            game_state.makeMove(move)
+            score = -self.quiescenceSearch(game_state, -beta, -alpha, -turn_multiplier, ply + 1)
+            game_state.undoMove()
+            if score > max_score:
+                max_score = score
+                if max_score > alpha:
+                    alpha = max_score
+                    if alpha >= beta:
+                        break
+        return max_score
+
+    def findMoveNegaMaxAlphaBeta(self, game_state, valid_moves, depth, alpha, beta, turn_multiplier, ply=0,
+                                 allow_null=True):
+        """
+        Principal variation search: the first move gets the full window, the others a zero window around alpha
+        that is only widened again when a move turns out better than the first.
+        """
+        if not valid_moves:
+            return turn_multiplier * scoreBoard(game_state, ply)
+        if depth <= 0:
+            return self.quiescenceSearch(game_state, alpha, beta, turn_multiplier, ply)
+        self.countNode()
+        if ply > 0:
+            # a position that repeats one from earlier in the game or the search is a draw, if it was worth more
+            # the side that can repeat it would have played something else before
+            if game_state.getRepetitions() or game_state.halfmove_clock >= 100:
+                self.repetition_draws += 1
+                return STALEMATE
+            solved = self.tablebases.probe(game_state)
+            if solved is not None:
+                self.tablebase_hits += 1
+                outcome, plies = solved
+                return outcome * (TABLEBASE_WIN - ply - plies)
+        in_check = game_state.inCheck()  # not game_state.in_check, a re-search finds it set by a deeper node
+        pv_table = self.pv_table
+        pv_table[ply] = []
+        original_alpha = alpha
+        key = game_state.zobrist_key
+        entry = self.transposition_table.probe(key)
+        hash_move = None
+        if entry is not None:
+            entry_depth, entry_flag, entry_score, hash_move = entry
+            entry_score = fromTableScore(entry_score, ply)
+            if entry_depth >= depth and ply > 0:  # the root always searches, it has to set root_move
+                if entry_flag == EXACT:
+                    if hash_move is not None:
+                        pv_table[ply] = [hash_move]  # the rest of the line is cut off by the hit
+                    return entry_score
+                elif entry_flag == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        static_score = turn_multiplier * game_state.score
+        if ply > 0 and not in_check:
+            # razoring: far below alpha near the leaves, only captures could save the node
+            if RAZORING and depth < len(RAZOR_MARGINS) and static_score + RAZOR_MARGINS[depth] <= alpha:
+                score = self.quiescenceSearch(game_state, alpha, beta, turn_multiplier, ply)
+                if score <= alpha:
+                    self.razor_cutoffs += 1
+                    return score
+            # null move: if passing still fails high, a real move will as well
+            if NULL_MOVE_PRUNING and allow_null and depth >= NULL_MOVE_MIN_DEPTH and static_score >= beta and \
+                    hasPieces(game_state):
+                self.null_move_tries += 1
+                game_state.makeNullMove()
+                score = -self.findMoveNegaMaxAlphaBeta(game_state, game_state.getValidMoves(),
+                                                       depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1,
+                                                       -turn_multiplier, ply + 1, False)
+                game_state.undoNullMove()
+                if score >= beta:
+                    self.null_move_cutoffs += 1
+                    return beta if score >= MATE_BOUND else score  # a mate found after passing proves nothing
+        futile = FUTILITY_PRUNING and not in_check and ply > 0 and depth < len(FUTILITY_MARGINS) and \
+            static_score + FUTILITY_MARGINS[depth] <= alpha
+
+        # search the stored best move first, or else the move the last iteration's principal variation played here
+        if hash_move is None and ply < len(self.principal_variation):
+            hash_move = self.principal_variation[ply]
+        self.orderMoves(valid_moves, hash_move, ply)
+        max_score = -INFINITE_SCORE
+        best_move = None
+        killers = self.killer_moves[ply]
+        for move_number, move in enumerate(valid_moves):
+            quiet = not move & ChessEngine.CAPTURE_OR_PROMOTION_MASK
+            game_state.makeMove(move)
+            if futile and quiet and move_number > 0 and not game_state.inCheck():
+                # decided before the child's moves are generated, so a pruned move costs one check test
+                self.futility_pruned += 1
+                game_state.undoMove()
+                continue
+            if depth > 1:
+                next_moves = game_state.getValidMoves()
+                gives_check = game_state.in_check
+            else:
+                next_moves = None
+                gives_check = game_state.inCheck()
+            pv_table[ply + 1] = []
+            if move_number == 0:
+                score = -self.searchChild(game_state, next_moves, depth - 1, -beta, -alpha, turn_multiplier, ply)
+            else:
+                reduction = 0
+                if quiet and not gives_check:
+                    # late quiet moves are unlikely to be best, they are tried one ply shallower
+                    if LATE_MOVE_REDUCTIONS and depth >= LATE_MOVE_MIN_DEPTH and \
+                            move_number >= LATE_MOVE_MIN_NUMBER and not in_check and \
+                            move != killers[0] and move != killers[1]:
+                        reduction = 1
+                        self.late_move_reductions += 1
+                score = -self.searchChild(game_state, next_moves, depth - 1 - reduction, -alpha - 1, -alpha,
+                                          turn_multiplier, ply)
+                if score > alpha and reduction:
+                    self.late_move_researches += 1
+                    score = -self.searchChild(game_state, next_moves, depth - 1, -alpha - 1, -alpha,
+                                              turn_multiplier, ply)
+                if alpha < score < beta:
+                    self.pvs_researches += 1
+                    score = -self.searchChild(game_state, next_moves, depth - 1, -beta, -alpha, turn_multiplier, ply)
+            game_state.undoMove()
+            if score > max_score:
+                max_score = score
+                best_move = move
+                if ply == 0:
+                    self.root_move = move
+            if max_score > alpha:
+                alpha = max_score
+                pv_table[ply] = [move] + pv_table[ply + 1]
+            if alpha >= beta:
+                self.cutoffs += 1
+                if move_number == 0:
+                    self.first_move_cutoffs += 1
+                self.storeCutoff(move, depth, ply)
+                break
+        if max_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif max_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transposition_table.store(key, depth, flag, toTableScore(max_score, ply), best_move)
+        return max_score
+
+    def searchChild(self, game_state, next_moves, depth, alpha, beta, turn_multiplier, ply):
+        """
+        Search the position after a move of the node at ply, the leaves only generate captures.
+        """
+        if depth > 0:
+            return self.findMoveNegaMaxAlphaBeta(game_state, next_moves, depth, alpha, beta, -turn_multiplier, ply + 1)
+        return self.quiescenceSearch(game_state, alpha, beta, -turn_multiplier, ply + 1)
+
+
+def addRates(stats):
+    """
+    Add the rates to the counters of a search: nodes per second, the share of the full-width nodes that failed
+    high and of those the share that did on the first move, the effective branching factor, the nodes of the last
+    iteration over the ones of the iteration before, and the transposition table hit and collision rates.
+    """
+    interior_nodes = stats["nodes"] - stats["qnodes"]
+    stats["nps"] = int(stats["nodes"] / stats["seconds"]) if stats["seconds"] else 0
+    stats["cutoff_rate"] = stats["cutoffs"] / interior_nodes if interior_nodes else 0.0
+    stats["first_move_cutoff_rate"] = stats["first_move_cutoffs"] / stats["cutoffs"] if stats["cutoffs"] else 0.0
+    iteration_nodes = [iteration["nodes"] for iteration in stats["iterations"] if iteration["nodes"]]
+    stats["branching_factor"] = iteration_nodes[-1] / iteration_nodes[-2] if len(iteration_nodes) > 1 else 0.0
+    table = stats["transposition_table"]
+    table["hit_rate"] = table["hits"] / table["probes"] if table["probes"] else 0.0
+    table["collision_rate"] = table["collisions"] / table["probes"] if table["probes"] else 0.0
+    return stats
+
+
+def mergeStats(stats_list, depth, seconds):
+    """
+    Stats of a search split over processes: the counters of the workers added up, and the iterations
+    up to depth with the nodes of all workers and the seconds of the slowest.
+    """
+    merged = {"depth": depth, "seconds": round(seconds, 4), "iterations": [], "transposition_table": {}}
+    for stats in stats_list:
+        for name, value in stats.items():
+            if type(value) is int and name not in ("depth", "nps"):
+                merged[name] = merged.get(name, 0) + value
+        for name, value in stats["transposition_table"].items():
+            if type(value) is int:
+                table = merged["transposition_table"]
+                table[name] = value if name == "size" else table.get(name, 0) + value
+    for iteration_depth in range(1, depth + 1):
+        iterations = [iteration for stats in stats_list for iteration in stats["iterations"]
+                      if iteration["depth"] == iteration_depth]
+        if iterations:
+            merged["iterations"].append({"depth": iteration_depth,
+                                         "nodes": sum(iteration["nodes"] for iteration in iterations),
+                                         "seconds": max(iteration["seconds"] for iteration in iterations)})
+    return addRates(merged)
+
+
+def writeStats(path, result, fen=None):
+    """
+    Append a search result to a JSON-lines file, one line per search with the time, the position, the move,
+    the score, the depth and the stats, so production runs can be graphed.
+    """
+    record = {"time": round(time.time(), 3),
+              "fen": fen,
+              "move": ChessEngine.Move.fromPacked(result["move"]).getUciNotation() if result["move"] else None,
+              "score": result["score"],
+              "depth": result["depth"],
+              "stats": result["stats"]}
+    with open(path, "a") as stats_file:
+        stats_file.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def setGenerator(name):
+    """
+    Search on the move generator of that name from now on, raises ValueError if the search cannot run on it.
+    """
+    global GENERATOR
+    ChessGenerators.getGenerator(name, search=True)
+    GENERATOR = name
+
+
+def getGameStateClass():
+    """
+    The game state class of GENERATOR, the positions the search gets are set up on it.
+    """
+    return ChessGenerators.getGenerator(GENERATOR, search=True)
+
+
+def findBestMove(game_snapshot, valid_moves, return_queue, move_time=MOVE_TIME, time_left=None, increment=0.0,
+                 max_depth=MAX_DEPTH, stop_event=None, table=None, book_path=None):
+    """
+    Search the position of a GameState.getSnapshot and put the best move on the queue, runs in its own process.
+    Pass a SharedTranspositionTable as table to keep what was learned from one move to the next,
+    and the path of a ChessBook file as book_path to play from it while the position is in it.
+    """
+    game_state = getGameStateClass().fromSnapshot(game_snapshot)
+    if book_path is not None and os.path.exists(book_path):
+        book = ChessBook.OpeningBook(book_path)
+        move = book.pickMove(game_state)
+        book.close()
+        if move is not None:
+            return_queue.put(move)
+            return
+    random.shuffle(valid_moves)  # moves that order the same are tried in a different order every game
+    searcher = Searcher(table if table is not None else getTranspositionTable())
+    result = searcher.search(game_state, valid_moves, move_time, time_left, increment, max_depth, stop_event)
+    return_queue.put(result["move"])
+
+
+def searchRootMoves(game_snapshot, root_moves, move_time=MOVE_TIME, time_left=None, increment=0.0,
+                    max_depth=MAX_DEPTH, table=None):
+    """
+    Search a share of the root moves in a worker process of searchParallel.
+    """
+    game_state = getGameStateClass().fromSnapshot(game_snapshot)
+    searcher = Searcher(table if table is not None else getTranspositionTable())
+    result = searcher.search(game_state, root_moves, move_time, time_left, increment, max_depth)
+    if table is not None:
+        table.close()
+    return result
+
+
+def splitRootMoves(valid_moves, processes):
+    """
+    Deal the root moves out to the workers in MVV-LVA order, so every worker gets some of the likely best.
+    """
+    moves = list(valid_moves)
+    orderCaptures(moves)
+    return [moves[i::processes] for i in range(min(processes, len(moves)))]
+
+
+def mergeRootResults(results, root_moves):
+    """
+    Merge the results of the workers into one, from the deepest iteration every worker finished.
+    A worker that stopped early on a mate score keeps its last iteration, more depth does not change a mate.
+    Equal scores go to the move that was ordered first, so the same searches always merge to the same move.
+    """
+    depth = min([result["depth"] for result in results if abs(result["score"]) < MATE_BOUND] or
+                [max(result["depth"] for result in results)])
+    best = None
+    for worker, (result, moves) in enumerate(zip(results, root_moves)):
+        iterations = [iteration for iteration in result["iterations"] if iteration["depth"] <= depth]
+        if not iterations:
+            continue
+        iteration = iterations[-1]
+        order = moves.index(iteration["move"]) * len(root_moves) + worker  # place in the move ordering
+        key = (iteration["score"], -order)
+        if best is None or key > best[0]:
+            best = (key, iteration, result)
+    if best is None:  # no worker finished an iteration
+        return {"move": root_moves[0][0], "score": 0, "depth": 0, "pv": [],
+                "nodes": sum(result["nodes"] for result in results)}
+    _, iteration, result = best
+    return {"move": iteration["move"],
+            "score": iteration["score"],
+            "depth": depth,
+            "pv": result["pv"] if result["depth"] == iteration["depth"] else [iteration["move"]],
+            "nodes": sum(result["nodes"] for result in results)}
+
+
+def searchParallel(game_snapshot, valid_moves=None, move_time=MOVE_TIME, time_left=None, increment=0.0,
+                   max_depth=MAX_DEPTH, processes=None, pool=None, table=None, stats_path=None):
+    """
+    Split the root moves over a pool of processes, every one of them searches its share with its own Searcher,
+    and merge what they found. Returns the same dict as Searcher.search, less the iterations,
+    with the stats of the workers merged, which are also written to stats_path if it is given.
+    A pool can be passed in to save starting the processes again for every move. The workers share table,
+    a SharedTranspositionTable, or else a new one that only lives as long as the search.
+    """
+    start_time = time.perf_counter()
+    game_state = getGameStateClass().fromSnapshot(game_snapshot)
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    if not valid_moves:
+        return {"move": None, "score": 0, "depth": 0, "pv": [], "nodes": 0, "seconds": 0.0}
+    processes = processes or multiprocessing.cpu_count()
+    root_moves = splitRootMoves(valid_moves, processes)
+    search_table = table if table is not None else SharedTranspositionTable()
+    search_table.newSearch()  # entries of earlier moves are old to every worker, the workers start from this age
+    tasks = [(game_snapshot, moves, move_time, time_left, increment, max_depth, search_table) for moves in root_moves]
+    try:
+        if pool is None:
+            with multiprocessing.Pool(len(root_moves)) as pool:
+                results = pool.starmap(searchRootMoves, tasks)
+        else:
+            results = pool.starmap(searchRootMoves, tasks)
+    finally:
+        if table is None:
+            search_table.unlink()
+    result = mergeRootResults(results, root_moves)
+    result["seconds"] = time.perf_counter() - start_time
+    result["stats"] = mergeStats([worker_result["stats"] for worker_result in results], result["depth"],
+                                 result["seconds"])
+    if stats_path is not None:
+        writeStats(stats_path, result, game_state.getFen())
+    return result
+
+
+def findBestMoveParallel(game_snapshot, valid_moves, return_queue, move_time=MOVE_TIME, time_left=None,
+                         increment=0.0, max_depth=MAX_DEPTH, processes=None, table=None):
+    """
+    findBestMove on all cores, for a Process target like findBestMove.
+    """
+    result = searchParallel(game_snapshot, valid_moves, move_time, time_left, increment, max_depth, processes,
+                            table=table)
+    return_queue.put(result["move"])
+
+
+def benchmarkParallel(positions, depth, processes=None, stats_path=None):
+    """
+    Search every position to a fixed depth on one core and split over processes, to measure the speedup.
+    The stats of every search go to stats_path if it is given.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    results = []
+    with multiprocessing.Pool(processes) as pool:
+        for position in positions:
+            game_state = getGameStateClass().fromFen(position["fen"])
+            if not game_state.getValidMoves():
+                continue
+            single = Searcher(stats_path=stats_path).search(game_state, move_time=float("inf"), max_depth=depth)
+            parallel = searchParallel(game_state.getSnapshot(), move_time=float("inf"), max_depth=depth,
+                                      processes=processes, pool=pool, stats_path=stats_path)
+            results.append({"position": position["name"],
+                            "depth": depth,
+                            "single_nodes": single["nodes"],
+                            "single_seconds": round(single["seconds"], 4),
+                            "parallel_nodes": parallel["nodes"],
+                            "parallel_seconds": round(parallel["seconds"], 4),
+                            "speedup": round(single["seconds"] / parallel["seconds"], 2),
+                            "same_score": single["score"] == parallel["score"]})
+    single_seconds = sum(result["single_seconds"] for result in results)
+    parallel_seconds = sum(result["parallel_seconds"] for result in results)
+    return {"processes": processes,
+            "results": results,
+            "speedup": round(single_seconds / parallel_seconds, 2) if parallel_seconds else 0.0}
+
+
+def orderCaptures(moves):
+    """
+    Sort captures and promotions by MVV-LVA, the quiescence search has no hash move or killers.
+    """
+    moves.sort(key=lambda move: MVV_LVA[(move >> ChessEngine.CAPTURED_SHIFT & ChessEngine.PIECE_TYPE_MASK) or
+                                        move >> ChessEngine.PROMOTION_SHIFT & ChessEngine.PIECE_TYPE_MASK]
+               [move >> ChessEngine.MOVED_SHIFT & ChessEngine.PIECE_TYPE_MASK], reverse=True)
+
+
+def hasPieces(game_state):
+    """
+    True if the side to move has a piece other than pawns and king, without one null-move pruning is unsafe
+    because passing may be the only thing that is not a bad move (zugzwang).
+    """
+    return game_state.piece_counts[0 if game_state.white_to_move else 1] > 0
+
+
+def toTableScore(score, ply):
+    """
+    A mate or tablebase score counts the plies from the root, the transposition table keeps it counted
+    from the node at ply so a hit at another ply gets the right distance back from fromTableScore.
+    """
+    if score >= TABLEBASE_BOUND:
+        return score + ply
+    if score <= -TABLEBASE_BOUND:
+        return score - ply
+    return score
+
+
+def fromTableScore(score, ply):
+    if score >= TABLEBASE_BOUND:
+        return score - ply
+    if score <= -TABLEBASE_BOUND:
+        return score + ply
+    return score
+
+
+def matePlies(score):
+    """
+    Plies to the mate of a mate or tablebase win score, for either side, None for any other score.
+    """
+    if abs(score) >= MATE_BOUND:
+        return CHECKMATE - abs(score)
+    if abs(score) >= TABLEBASE_BOUND:
+        return TABLEBASE_WIN - abs(score)
+    return None
+
+
+def scoreBoard(game_state, ply=0):
     """
     Score the board. A positive score is good for white, a negative score is good for black.
+    A checkmate ply plies from the root of the search scores less the further away it is, so the shortest is best.
     """
     if game_state.checkmate:
         if game_state.white_to_move:
-            return -CHECKMATE  # black wins
+            return ply - CHECKMATE  # black wins
         else:
-            return CHECKMATE  # white wins
+            return CHECKMATE - ply  # white wins
     elif game_state.stalemate:
         return STALEMATE
-    score = 0
-    for row in range(len(game_state.board)):
-        for col in range(len(game_state.board[row])):
-            piece = game_state.board[row][col]
-            if piece != "--":
-                piece_position_score = 0
-                if piece[1] != "K":
-                    piece_position_score = piece_position_scores[piece][row][col]
-                if piece[0] == "w":
-                    score += piece_score[piece[1]] + piece_position_score
-                if piece[0] == "b":
-                    score -= piece_score[piece[1]] + piece_position_score
-
-    return score
+    return game_state.score  # material and piece-square score, kept up to date by makeMove and undoMove
 
 
 def findRandomMove(valid_moves):
     """
     Picks and returns a random valid move.
     """
-    return random.choice(valid_moves)
\ No newline at end of file
+    return random.choice(valid_moves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the engine over UCI or benchmark the search.")
+    parser.add_argument("--uci", action="store_true", help="talk UCI on stdin and stdout, without pygame")
+    parser.add_argument("--bench", type=int, metavar="DEPTH",
+                        help="search the perft positions to DEPTH on one core and on all of them, print the speedup")
+    parser.add_argument("--processes", type=int, help="processes for the parallel search (default one per core)")
+    parser.add_argument("--stats", metavar="FILE", help="append the stats of every search to FILE as JSON lines")
+    parser.add_argument("--generator", default=GENERATOR, choices=sorted(filter(ChessGenerators.canSearch,
+                                                                              ChessGenerators.GENERATORS)),
+                        help="move generator to search on (default %s)" % GENERATOR)
+    args = parser.parse_args()
+    setGenerator(args.generator)
+    if args.uci:
+        import ChessUCI  # imported here, it imports this module itself
+        ChessUCI.main(args.generator)
+    elif args.bench:
+        report = benchmarkParallel(ChessPerft.POSITIONS, args.bench, args.processes, args.stats)
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
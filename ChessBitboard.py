@@ -0,0 +1,451 @@
+"""
+Bitboard move generator, a second and independent implementation of ChessEngine.GameState's move generation
+that the perft suite checks ChessEngine against (see ChessPerft and ChessGenerators).
+Every piece type of every color keeps a 64-bit occupancy and moves are generated from attack tables
+that are computed once at import, instead of walking the 8x8 board square by square.
+It is a cross-check, not a faster backend: it subclasses GameState, so makeMove does all of GameState's
+work on the board, score and zobrist key and toggles the bitboards on top, and its generator is slower than
+ChessEngine's precomputed rays. The AI and the GUI can still run on it, the interface is the same.
+"""
+import ChessEngine
+from ChessEngine import (PIECE_CODES, PIECE_NAMES, SQUARE_MASK, PIECE_MASK, END_SHIFT, MOVED_SHIFT, CAPTURED_SHIFT,
+                         PROMOTION_SHIFT, PROMOTION_MASK, ENPASSANT_FLAG, CASTLE_FLAG, WHITE_KING_SIDE,
+                         WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE, appendPawnMove)
+
+# squares are numbered row * 8 + col, so bit 0 is a8 and bit 63 is h1 (same orientation as the board list)
+FULL_BOARD = (1 << 64) - 1
+
+# ray directions as (row, col) steps, the first four increase the square index and the last four decrease it
+SOUTH, EAST, SOUTH_WEST, SOUTH_EAST, NORTH, WEST, NORTH_WEST, NORTH_EAST = range(8)
+DIRECTIONS = ((1, 0), (0, 1), (1, -1), (1, 1), (-1, 0), (0, -1), (-1, -1), (-1, 1))
+
+
+def squareBit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def buildStepAttacks(steps):
+    """
+    Attacks of a piece that jumps by fixed (row, col) steps, one bitboard per square.
+    """
+    attacks = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        bitboard = 0
+        for d_row, d_col in steps:
+            if 0 <= row + d_row <= 7 and 0 <= col + d_col <= 7:
+                bitboard |= squareBit(row + d_row, col + d_col)
+        attacks.append(bitboard)
+    return attacks
+
+
+def buildRays():
+    """
+    For every direction and square, all the squares up to the edge of the board (the square itself excluded).
+    """
+    rays = []
+    for d_row, d_col in DIRECTIONS:
+        direction_rays = []
+        for square in range(64):
+            row, col = divmod(square, 8)
+            bitboard = 0
+            for i in range(1, 8):
+                end_row = row + d_row * i
+                end_col = col + d_col * i
+                if not (0 <= end_row <= 7 and 0 <= end_col <= 7):
+                    break
+                bitboard |= squareBit(end_row, end_col)
+            direction_rays.append(bitboard)
+        rays.append(direction_rays)
+    return rays
+
+
+def buildBetween():
+    """
+    Squares strictly between two squares on a common line, zero if they are not aligned.
+    """
+    between = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        for direction in range(8):
+            ray = RAYS[direction][square]
+            while ray:
+                target_bit = ray & -ray
+                target = target_bit.bit_length() - 1
+                between[square][target] = RAYS[direction][square] & ~RAYS[direction][target] & ~target_bit
+                ray ^= target_bit
+    return between
+
+
+KNIGHT_ATTACKS = buildStepAttacks(((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2)))
+KING_ATTACKS = buildStepAttacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# squares attacked by a pawn of the given color standing on a square
+PAWN_ATTACKS = {"w": buildStepAttacks(((-1, -1), (-1, 1))), "b": buildStepAttacks(((1, -1), (1, 1)))}
+RAYS = buildRays()
+BETWEEN = buildBetween()
+ROOK_RAYS = [RAYS[SOUTH][square] | RAYS[EAST][square] | RAYS[NORTH][square] | RAYS[WEST][square]
+             for square in range(64)]
+BISHOP_RAYS = [RAYS[SOUTH_WEST][square] | RAYS[SOUTH_EAST][square] | RAYS[NORTH_WEST][square] |
+               RAYS[NORTH_EAST][square] for square in range(64)]
+
+# pawns on these ranks can still make a two square advance
+PAWN_START_RANKS = {"w": 0xFF << 48, "b": 0xFF << 8}
+PROMOTION_RANKS = 0xFF | 0xFF << 56
+
+
+def rookAttacks(square, occupied):
+    """
+    Squares a rook on square attacks given the occupancy, blocked squares are included.
+    The nearest blocker on each ray is the lowest set bit for rays going south/east and the highest for north/west.
+    """
+    south, east, north, west = RAYS[SOUTH], RAYS[EAST], RAYS[NORTH], RAYS[WEST]
+    attacks = south[square]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= south[(blockers & -blockers).bit_length() - 1]
+    ray = east[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= east[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = north[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= north[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = west[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= west[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def bishopAttacks(square, occupied):
+    """
+    Squares a bishop on square attacks given the occupancy, blocked squares are included.
+    """
+    south_west, south_east = RAYS[SOUTH_WEST], RAYS[SOUTH_EAST]
+    north_west, north_east = RAYS[NORTH_WEST], RAYS[NORTH_EAST]
+    attacks = south_west[square]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= south_west[(blockers & -blockers).bit_length() - 1]
+    ray = south_east[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= south_east[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = north_west[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= north_west[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = north_east[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= north_east[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+class BitboardGameState(ChessEngine.GameState):
+    def __init__(self):
+        """
+        The 8x8 board list is still kept up to date for the GUI and for Move objects,
+        the bitboards are the source for move generation and attack detection.
+        """
+        super().__init__()
+        self.bitboards = {}
+        self.occupancy = {}
+        self.loadBitboards()
+
+    def loadBitboards(self):
+        """
+        Rebuild all the bitboards from the 8x8 board, call it after editing the board directly.
+        """
+        self.bitboards = {color + piece: 0 for color in "wb" for piece in "pRNBQK"}
+        self.occupancy = {"w": 0, "b": 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.bitboards[piece] |= squareBit(row, col)
+                    self.occupancy[piece[0]] |= squareBit(row, col)
+
+    def setPosition(self, board, white_to_move, castling_rights, enpassant_possible, halfmove_clock, ply,
+                    previous_keys):
+        super().setPosition(board, white_to_move, castling_rights, enpassant_possible, halfmove_clock, ply,
+                            previous_keys)
+        self.loadBitboards()
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    def undoMove(self):
+        if len(self.move_log) != 0:
+            self.toggleMove(self.move_log[-1])
+            super().undoMove()
+
+    def toggleMove(self, move):
+        """
+        Apply the bitboard changes of a packed move.
+        Every change is an xor, so applying it twice takes the move back.
+        """
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        piece_moved = PIECE_NAMES[move >> MOVED_SHIFT & PIECE_MASK]
+        piece_captured = PIECE_NAMES[move >> CAPTURED_SHIFT & PIECE_MASK]
+        color = piece_moved[0]
+        start_square = move & SQUARE_MASK
+        end_square = move >> END_SHIFT & SQUARE_MASK
+        start_bit = 1 << start_square
+        end_bit = 1 << end_square
+        bitboards[piece_moved] ^= start_bit | end_bit
+        occupancy[color] ^= start_bit | end_bit
+        if piece_captured != "--":
+            if move & ENPASSANT_FLAG:
+                captured_bit = 1 << ((start_square & ~7) | (end_square & 7))  # beside the pawn, on its own row
+            else:
+                captured_bit = end_bit
+            bitboards[piece_captured] ^= captured_bit
+            occupancy[piece_captured[0]] ^= captured_bit
+        if move & PROMOTION_MASK:
+            bitboards[piece_moved] ^= end_bit
+            bitboards[PIECE_NAMES[move >> PROMOTION_SHIFT & PIECE_MASK]] ^= end_bit
+        elif move & CASTLE_FLAG:
+            if end_square > start_square:  # king-side, rook goes from h to f file
+                rook_bits = 1 << (end_square + 1) | 1 << (end_square - 1)
+            else:  # queen-side, rook goes from a to d file
+                rook_bits = 1 << (end_square - 2) | 1 << (end_square + 1)
+            bitboards[color + "R"] ^= rook_bits
+            occupancy[color] ^= rook_bits
+
+    def attackersTo(self, square, color, occupied):
+        """
+        Bitboard of the pieces of color that attack square, sliders are blocked by occupied.
+        """
+        bitboards = self.bitboards
+        # a pawn of color attacks square exactly when a pawn of the other color on square would attack the pawn
+        pawn_attacks = PAWN_ATTACKS["b" if color == "w" else "w"][square]
+        queens = bitboards[color + "Q"]
+        return ((pawn_attacks & bitboards[color + "p"]) |
+                (KNIGHT_ATTACKS[square] & bitboards[color + "N"]) |
+                (KING_ATTACKS[square] & bitboards[color + "K"]) |
+                (bishopAttacks(square, occupied) & (bitboards[color + "B"] | queens)) |
+                (rookAttacks(square, occupied) & (bitboards[color + "R"] | queens)))
+
+    def squareUnderAttack(self, row, col):
+        """
+        Determine if enemy can attack the square row col, the king of the side to move does not block.
+        """
+        if self.white_to_move:
+            ally_color, enemy_color = "w", "b"
+        else:
+            ally_color, enemy_color = "b", "w"
+        occupied = (self.occupancy["w"] | self.occupancy["b"]) ^ self.bitboards[ally_color + "K"]
+        return self.attackersTo(row * 8 + col, enemy_color, occupied) != 0
+
+    def inCheck(self):
+        """
+        Determine if a current player is in check
+        """
+        ally_color = "w" if self.white_to_move else "b"
+        king_bit = self.bitboards[ally_color + "K"]
+        return self.squareUnderAttack(*divmod(king_bit.bit_length() - 1, 8))
+
+    def getValidMoves(self):
+        """
+        All moves considering checks.
+        Pins and checks are found with x-rays from the king, so every generated move is already legal.
+        """
+        return self.generateMoves(False)
+
+    def getCaptureMoves(self):
+        """
+        Legal captures and promotions only, or every legal move when in check.
+        """
+        return self.generateMoves(True)
+
+    def generateMoves(self, captures_only):
+        bitboards = self.bitboards
+        if self.white_to_move:
+            ally_color, enemy_color = "w", "b"
+        else:
+            ally_color, enemy_color = "b", "w"
+        allies = self.occupancy[ally_color]
+        enemies = self.occupancy[enemy_color]
+        occupied = allies | enemies
+        king_square = bitboards[ally_color + "K"].bit_length() - 1
+        checkers = self.attackersTo(king_square, enemy_color, occupied)
+        self.in_check = checkers != 0
+        captures_only = captures_only and not checkers  # every way out of check is needed
+        moves = []
+
+        # the king never needs the pin or check information, only the squares it steps on have to be safe
+        occupied_without_king = occupied ^ (1 << king_square)
+        squares = self.squares  # moves are packed inline here, a packMove call per move costs a third of the time
+        king_move = king_square | squares[king_square] << MOVED_SHIFT
+        targets = KING_ATTACKS[king_square] & (enemies if captures_only else ~allies)
+        while targets:
+            target_bit = targets & -targets
+            target = target_bit.bit_length() - 1
+            targets ^= target_bit
+            if not self.attackersTo(target, enemy_color, occupied_without_king):
+                moves.append(king_move | target << END_SHIFT | squares[target] << CAPTURED_SHIFT)
+
+        if checkers & (checkers - 1):  # double check, king has to move
+            self.setGameOver(moves)
+            return moves
+
+        if checkers:  # block the check or capture the checking piece
+            checker = checkers.bit_length() - 1
+            target_mask = BETWEEN[king_square][checker] | checkers
+        elif captures_only:
+            target_mask = enemies
+        else:
+            target_mask = FULL_BOARD
+            self.generateCastleMoves(king_square, occupied, enemy_color, moves)
+
+        # a pinned piece can only move along the line between the king and the pinning piece
+        pin_masks = {}
+        queens = bitboards[enemy_color + "Q"]
+        snipers = ((ROOK_RAYS[king_square] & (bitboards[enemy_color + "R"] | queens)) |
+                   (BISHOP_RAYS[king_square] & (bitboards[enemy_color + "B"] | queens)))
+        while snipers:
+            sniper_bit = snipers & -snipers
+            snipers ^= sniper_bit
+            line = BETWEEN[king_square][sniper_bit.bit_length() - 1]
+            blockers = line & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & allies:
+                pin_masks[blockers.bit_length() - 1] = line | sniper_bit
+
+        free_squares = ~allies & target_mask
+        for piece, attacks in (("N", None), ("B", bishopAttacks), ("R", rookAttacks), ("Q", None)):
+            pieces = bitboards[ally_color + piece]
+            while pieces:
+                piece_bit = pieces & -pieces
+                pieces ^= piece_bit
+                square = piece_bit.bit_length() - 1
+                piece_move = square | squares[square] << MOVED_SHIFT
+                if piece == "N":
+                    if square in pin_masks:
+                        continue  # a pinned knight can never move
+                    targets = KNIGHT_ATTACKS[square] & free_squares
+                elif piece == "Q":
+                    targets = (bishopAttacks(square, occupied) | rookAttacks(square, occupied)) & free_squares
+                else:
+                    targets = attacks(square, occupied) & free_squares
+                if square in pin_masks:
+                    targets &= pin_masks[square]
+                while targets:
+                    target_bit = targets & -targets
+                    targets ^= target_bit
+                    target = target_bit.bit_length() - 1
+                    moves.append(piece_move | target << END_SHIFT | squares[target] << CAPTURED_SHIFT)
+
+        # pushes never capture, with captures only they still go to the last rank to promote
+        push_mask = PROMOTION_RANKS if captures_only else target_mask
+        self.generatePawnMoves(ally_color, enemies, occupied, target_mask, push_mask, pin_masks, king_square, moves)
+        if not captures_only:
+            self.setGameOver(moves)
+        return moves
+
+    def generatePawnMoves(self, ally_color, enemies, occupied, target_mask, push_mask, pin_masks, king_square,
+                          moves):
+        """
+        Get all the legal pawn moves for the side to move and add them to the list.
+        Captures may land on target_mask and pushes on push_mask.
+        """
+        pawns = self.bitboards[ally_color + "p"]
+        pawn_attacks = PAWN_ATTACKS[ally_color]
+        start_rank = PAWN_START_RANKS[ally_color]
+        step = -8 if ally_color == "w" else 8
+        if self.enpassant_possible:
+            enpassant_square = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+            # the landing square is empty, the captured pawn has to be packed in by hand
+            enpassant_flags = ENPASSANT_FLAG | PIECE_CODES[("b" if ally_color == "w" else "w") + "p"] << CAPTURED_SHIFT
+        else:
+            enpassant_square = -1
+        while pawns:
+            pawn_bit = pawns & -pawns
+            pawns ^= pawn_bit
+            square = pawn_bit.bit_length() - 1
+            allowed = target_mask
+            allowed_pushes = push_mask
+            if square in pin_masks:
+                allowed &= pin_masks[square]
+                allowed_pushes &= pin_masks[square]
+            one_step = square + step
+            if not occupied >> one_step & 1:
+                if allowed_pushes >> one_step & 1:
+                    appendPawnMove(moves, self.packMove(square, one_step))
+                two_step = one_step + step
+                if pawn_bit & start_rank and not occupied >> two_step & 1 and allowed_pushes >> two_step & 1:
+                    self.appendMove(square, two_step, moves)
+            captures = pawn_attacks[square] & enemies & allowed
+            while captures:
+                target_bit = captures & -captures
+                captures ^= target_bit
+                appendPawnMove(moves, self.packMove(square, target_bit.bit_length() - 1))
+            if enpassant_square >= 0 and pawn_attacks[square] >> enpassant_square & 1:
+                if self.isLegalEnpassant(square, enpassant_square, step, king_square, occupied):
+                    self.appendMove(square, enpassant_square, moves, enpassant_flags)
+
+    def isLegalEnpassant(self, square, enpassant_square, step, king_square, occupied):
+        """
+        En passant removes two pieces from the board at once, so instead of using the pin masks
+        the capture is played on the occupancy and the king is checked for sliding attacks.
+        """
+        enemy_color = "b" if self.white_to_move else "w"
+        captured_bit = 1 << (enpassant_square - step)
+        occupied = (occupied ^ (1 << square) ^ captured_bit) | (1 << enpassant_square)
+        bitboards = self.bitboards
+        queens = bitboards[enemy_color + "Q"]
+        if rookAttacks(king_square, occupied) & (bitboards[enemy_color + "R"] | queens):
+            return False
+        if bishopAttacks(king_square, occupied) & (bitboards[enemy_color + "B"] | queens):
+            return False
+        # the captured pawn may be the only piece giving check, any other checker still has to be dealt with
+        other_checkers = ((KNIGHT_ATTACKS[king_square] & bitboards[enemy_color + "N"]) |
+                          (PAWN_ATTACKS["w" if self.white_to_move else "b"][king_square] &
+                           bitboards[enemy_color + "p"] & ~captured_bit))
+        return other_checkers == 0
+
+    def generateCastleMoves(self, king_square, occupied, enemy_color, moves):
+        """
+        Generate the castle moves for a king that is not in check and add them to the list.
+        """
+        if self.white_to_move:
+            king_side = self.castling_rights & WHITE_KING_SIDE
+            queen_side = self.castling_rights & WHITE_QUEEN_SIDE
+        else:
+            king_side = self.castling_rights & BLACK_KING_SIDE
+            queen_side = self.castling_rights & BLACK_QUEEN_SIDE
+        if king_side and not occupied & (0b11 << (king_square + 1)):
+            if not self.attackersTo(king_square + 1, enemy_color, occupied) and \
+                    not self.attackersTo(king_square + 2, enemy_color, occupied):
+                self.appendMove(king_square, king_square + 2, moves, CASTLE_FLAG)
+        if queen_side and not occupied & (0b111 << (king_square - 3)):
+            if not self.attackersTo(king_square - 1, enemy_color, occupied) and \
+                    not self.attackersTo(king_square - 2, enemy_color, occupied):
+                self.appendMove(king_square, king_square - 2, moves, CASTLE_FLAG)
+
+    def packMove(self, start_square, end_square, flags=0):
+        """
+        Pack the move from start_square to end_square, the pieces are read from the board.
+        """
+        squares = self.squares
+        return (start_square | end_square << END_SHIFT | squares[start_square] << MOVED_SHIFT |
+                squares[end_square] << CAPTURED_SHIFT | flags)
+
+    def appendMove(self, start_square, end_square, moves, flags=0):
+        moves.append(self.packMove(start_square, end_square, flags))
+
+    def setGameOver(self, moves):
+        if len(moves) == 0:
+            if self.in_check:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = False
@@ -0,0 +1,150 @@
+"""
+Opening book: a sorted file of fixed-width entries keyed by the position's zobrist key.
+The file is memory-mapped and binary-searched, so opening it reads nothing and a lookup touches a few pages.
+Entries have the Polyglot layout (key, move, weight, learn), but the keys are this engine's zobrist keys,
+so Polyglot books from elsewhere do not work with it and its books do not work elsewhere.
+Running this file builds a book from PGN files or looks up a position.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+
+import ChessEngine
+import ChessPGN
+from ChessEngine import SQUARE_MASK, END_SHIFT, PROMOTION_SHIFT, PIECE_TYPE_MASK
+
+ENTRY = struct.Struct(">QHHI")  # key, move, weight, learn, big-endian like Polyglot
+BOOK_FILE = "book.bin"  # looked for in the working directory when no other book is given
+BOOK_PLIES = 30  # plies of every game that go into the book
+MAX_WEIGHT = 0xFFFF
+
+
+def encodeMove(move):
+    """
+    The 16 bit book move of a packed move: start square, end square and the promotion piece type.
+    """
+    return move & SQUARE_MASK | (move >> END_SHIFT & SQUARE_MASK) << 6 | \
+        (move >> PROMOTION_SHIFT & PIECE_TYPE_MASK) << 12
+
+
+class OpeningBook:
+    """
+    Read-only book file, mapped into memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.book_file = open(path, "rb")
+        size = os.fstat(self.book_file.fileno()).st_size
+        self.entries = size // ENTRY.size
+        self.memory = mmap.mmap(self.book_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self):
+        if self.entries:
+            self.memory.close()
+        self.book_file.close()
+
+    def getEntries(self, key):
+        """
+        (book move, weight) of every entry of a position key.
+        """
+        low, high = 0, self.entries
+        while low < high:  # first entry with a key that is not smaller
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.memory, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self.entries):
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.memory, index * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((move, weight))
+        return entries
+
+    def getMoves(self, game_state):
+        """
+        (packed move, weight) of the legal book moves of the position.
+        """
+        entries = self.getEntries(game_state.zobrist_key)
+        if not entries:
+            return []
+        legal_moves = {encodeMove(move): move for move in game_state.getValidMoves()}
+        return [(legal_moves[move], weight) for move, weight in entries if move in legal_moves and weight]
+
+    def pickMove(self, game_state, random_generator=random):
+        """
+        A book move picked at random in proportion to its weight, or None when the position is not in the book.
+        """
+        moves = self.getMoves(game_state)
+        if not moves:
+            return None
+        return random_generator.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def buildBook(pgn_paths, output_path, max_plies=BOOK_PLIES, min_games=1):
+    """
+    Write a book of the first max_plies plies of every game of the PGN files.
+    A move scores 2 for every game the side that played it won and 1 for every draw or game without a result,
+    and a move played in fewer than min_games games is left out.
+    Returns the number of games read and of entries written.
+    """
+    scores = {}  # (key, book move) -> [games, score]
+    games = 0
+    for path in pgn_paths:
+        with open(path, encoding="utf-8", errors="replace") as pgn_file:
+            for game in ChessPGN.readGames(pgn_file):
+                games += 1
+                fen = game["headers"].get("FEN")
+                game_state = ChessEngine.GameState.fromFen(fen) if fen else ChessEngine.GameState()
+                result = game["result"]
+                for san in game["moves"][:max_plies]:
+                    try:
+                        move = ChessPGN.parseSan(game_state, san)
+                    except ValueError:
+                        break
+                    won = result == ("1-0" if game_state.white_to_move else "0-1")
+                    lost = result == ("0-1" if game_state.white_to_move else "1-0")
+                    entry = scores.setdefault((game_state.zobrist_key, encodeMove(move)), [0, 0])
+                    entry[0] += 1
+                    entry[1] += 2 if won else 0 if lost else 1
+                    game_state.makeMove(move)
+    entries = sorted((key, move, score) for (key, move), (count, score) in scores.items() if count >= min_games)
+    largest = max([score for _, _, score in entries] or [0])
+    scale = MAX_WEIGHT / largest if largest > MAX_WEIGHT else 1
+    with open(output_path, "wb") as book_file:
+        for key, move, score in entries:
+            book_file.write(ENTRY.pack(key, move, max(1, int(score * scale)) if score else 0, 0))
+    return games, len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files or look up a position.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN files")
+    build.add_argument("output", help="book file to write")
+    build.add_argument("pgn", nargs="+", help="PGN files to read")
+    build.add_argument("--plies", type=int, default=BOOK_PLIES, help="plies of every game (default %d)" % BOOK_PLIES)
+    build.add_argument("--min-games", type=int, default=1, help="games a move needs to be in the book (default 1)")
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("book", help="book file to read")
+    probe.add_argument("--fen", default=ChessEngine.START_FEN, help="position to look up (default the start)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        games, entries = buildBook(args.pgn, args.output, args.plies, args.min_games)
+        print("%d games, %d entries written to %s" % (games, entries, args.output), file=sys.stderr)
+    else:
+        book = OpeningBook(args.book)
+        game_state = ChessEngine.GameState.fromFen(args.fen)
+        for move, weight in sorted(book.getMoves(game_state), key=lambda entry: -entry[1]):
+            print(ChessPGN.getSan(game_state, move), weight)
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,205 @@ Storing all the information about the current state of chess game.
 Determining valid moves at current state.
 It will keep move log.
 """
+import random
+import struct
+
+# zobrist keys, generated from a fixed seed so every process hashes a position to the same value
+zobrist_random = random.Random(2021)
+ZOBRIST_PIECES = {color + piece: [zobrist_random.getrandbits(64) for _ in range(64)]
+                  for color in "wb" for piece in "pRNBQK"}  # indexed by row * 8 + col
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+ZOBRIST_ENPASSANT_FILES = [zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_CASTLING_RIGHTS = [zobrist_random.getrandbits(64) for _ in range(4)]  # one per castling right bit
+# one key for every combination of castling rights, so a change of rights is a single xor
+ZOBRIST_CASTLING = [0] * 16
+for rights_index in range(16):
+    for right in range(4):
+        if rights_index >> right & 1:
+            ZOBRIST_CASTLING[rights_index] ^= ZOBRIST_CASTLING_RIGHTS[right]
+
+# castling rights are the bits of a number between 0 and 15
+WHITE_KING_SIDE = 1
+WHITE_QUEEN_SIDE = 2
+BLACK_KING_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+ALL_CASTLING_RIGHTS = 15
+# rights that survive a move from or to the square: moving the king or a rook, or capturing a rook, loses them
+CASTLING_RIGHTS_MASKS = [ALL_CASTLING_RIGHTS] * 64
+CASTLING_RIGHTS_MASKS[0] = ALL_CASTLING_RIGHTS ^ BLACK_QUEEN_SIDE  # a8
+CASTLING_RIGHTS_MASKS[7] = ALL_CASTLING_RIGHTS ^ BLACK_KING_SIDE  # h8
+CASTLING_RIGHTS_MASKS[4] = ALL_CASTLING_RIGHTS ^ BLACK_KING_SIDE ^ BLACK_QUEEN_SIDE  # e8
+CASTLING_RIGHTS_MASKS[56] = ALL_CASTLING_RIGHTS ^ WHITE_QUEEN_SIDE  # a1
+CASTLING_RIGHTS_MASKS[63] = ALL_CASTLING_RIGHTS ^ WHITE_KING_SIDE  # h1
+CASTLING_RIGHTS_MASKS[60] = ALL_CASTLING_RIGHTS ^ WHITE_KING_SIDE ^ WHITE_QUEEN_SIDE  # e1
+
+# irreversible state saved by makeMove, one fixed-size record per move on the undo stack
+UNDO_CASTLING_RIGHTS, UNDO_ENPASSANT, UNDO_HALFMOVE_CLOCK, UNDO_ZOBRIST_KEY, UNDO_SCORE = range(5)
+UNDO_RECORD_SIZE = 5
+UNDO_STACK_MOVES = 512  # moves the stack is allocated for, it doubles if a game goes on longer
+
+# the search works on moves packed into a single int, Move objects are only built for the GUI and notation
+#   bits 0-5    start square (row * 8 + col)
+#   bits 6-11   end square
+#   bits 12-15  piece moved
+#   bits 16-19  piece captured, 0 if the move is not a capture
+#   bits 20-23  piece promoted to, 0 if the move is not a promotion
+#   bit 24      en-passant capture
+#   bit 25      castle move
+# piece codes keep the type in the low 3 bits and the color in bit 3
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+BLACK = 8
+PIECE_CODES = {"--": 0,
+               "wp": PAWN, "wN": KNIGHT, "wB": BISHOP, "wR": ROOK, "wQ": QUEEN, "wK": KING,
+               "bp": BLACK | PAWN, "bN": BLACK | KNIGHT, "bB": BLACK | BISHOP,
+               "bR": BLACK | ROOK, "bQ": BLACK | QUEEN, "bK": BLACK | KING}
+PIECE_NAMES = ["--"] * 16
+for piece_name, piece_code in PIECE_CODES.items():
+    PIECE_NAMES[piece_code] = piece_name
+
+# material and piece-square scores in centipawns, the tables are seen from white's side with rank 8 in the first row
+PIECE_SCORES = {"K": 0, "Q": 900, "R": 500, "B": 300, "N": 300, "p": 100}
+
+KNIGHT_SCORES = [[0, 10, 20, 20, 20, 20, 10, 0],
+                 [10, 30, 50, 50, 50, 50, 30, 10],
+                 [20, 50, 60, 65, 65, 60, 50, 20],
+                 [20, 55, 65, 70, 70, 65, 55, 20],
+                 [20, 50, 65, 70, 70, 65, 50, 20],
+                 [20, 55, 60, 65, 65, 60, 55, 20],
+                 [10, 30, 50, 55, 55, 50, 30, 10],
+                 [0, 10, 20, 20, 20, 20, 10, 0]]
+
+BISHOP_SCORES = [[0, 20, 20, 20, 20, 20, 20, 0],
+                 [20, 40, 40, 40, 40, 40, 40, 20],
+                 [20, 40, 50, 60, 60, 50, 40, 20],
+                 [20, 50, 50, 60, 60, 50, 50, 20],
+                 [20, 40, 60, 60, 60, 60, 40, 20],
+                 [20, 60, 60, 60, 60, 60, 60, 20],
+                 [20, 50, 40, 40, 40, 40, 50, 20],
+                 [0, 20, 20, 20, 20, 20, 20, 0]]
+
+ROOK_SCORES = [[25, 25, 25, 25, 25, 25, 25, 25],
+               [50, 75, 75, 75, 75, 75, 75, 50],
+               [0, 25, 25, 25, 25, 25, 25, 0],
+               [0, 25, 25, 25, 25, 25, 25, 0],
+               [0, 25, 25, 25, 25, 25, 25, 0],
+               [0, 25, 25, 25, 25, 25, 25, 0],
+               [0, 25, 25, 25, 25, 25, 25, 0],
+               [25, 25, 25, 50, 50, 25, 25, 25]]
+
+QUEEN_SCORES = [[0, 20, 20, 30, 30, 20, 20, 0],
+                [20, 40, 40, 40, 40, 40, 40, 20],
+                [20, 40, 50, 50, 50, 50, 40, 20],
+                [30, 40, 50, 50, 50, 50, 40, 30],
+                [40, 40, 50, 50, 50, 50, 40, 30],
+                [20, 50, 50, 50, 50, 50, 40, 20],
+                [20, 40, 50, 40, 40, 40, 40, 20],
+                [0, 20, 20, 30, 30, 20, 20, 0]]
+
+PAWN_SCORES = [[80, 80, 80, 80, 80, 80, 80, 80],
+               [70, 70, 70, 70, 70, 70, 70, 70],
+               [30, 30, 40, 50, 50, 40, 30, 30],
+               [25, 25, 30, 45, 45, 30, 25, 25],
+               [20, 20, 20, 40, 40, 20, 20, 20],
+               [25, 15, 10, 20, 20, 10, 15, 25],
+               [25, 30, 30, 0, 0, 30, 30, 25],
+               [20, 20, 20, 20, 20, 20, 20, 20]]
+
+# position tables of the white pieces by piece letter, black's are the same tables upside down
+POSITION_SCORES = {"N": KNIGHT_SCORES, "B": BISHOP_SCORES, "R": ROOK_SCORES, "Q": QUEEN_SCORES, "p": PAWN_SCORES}
+# material plus position of every piece code on every square, positive for white pieces and negative for black,
+# so the score of a position is the sum over its pieces and a move changes it by a few lookups
+PIECE_SQUARE_SCORES = [[0] * 64 for _ in range(16)]
+
+
+def setEvaluation(piece_scores=None, position_scores=None):
+    """
+    Fill PIECE_SQUARE_SCORES from material scores and white's position tables by piece letter, like PIECE_SCORES
+    and POSITION_SCORES, the pieces left out keep the defaults. The tables are changed in place for every game
+    state, but a game state keeps the score it has until it is set up again (loadFen, fromSnapshot).
+    """
+    material = dict(PIECE_SCORES, **(piece_scores or {}))
+    tables = dict(POSITION_SCORES, **(position_scores or {}))
+    for piece_name, piece_code in PIECE_CODES.items():
+        if piece_name == "--":
+            continue
+        table = tables.get(piece_name[1])
+        if table is not None and piece_name[0] == "b":
+            table = table[::-1]
+        for square in range(64):
+            square_score = material[piece_name[1]] + (table[square >> 3][square & 7] if table else 0)
+            PIECE_SQUARE_SCORES[piece_code][square] = square_score if piece_name[0] == "w" else -square_score
+
+
+setEvaluation()
+
+SQUARE_MASK = 0x3F
+PIECE_MASK = 0xF
+PIECE_TYPE_MASK = 0x7
+END_SHIFT = 6
+MOVED_SHIFT = 12
+CAPTURED_SHIFT = 16
+PROMOTION_SHIFT = 20
+PROMOTION_MASK = PIECE_MASK << PROMOTION_SHIFT
+ENPASSANT_FLAG = 1 << 24
+CASTLE_FLAG = 1 << 25
+CAPTURE_OR_PROMOTION_MASK = PIECE_MASK << CAPTURED_SHIFT | PROMOTION_MASK
+NULL_MOVE = 0  # stands in the move log for a passed turn, a real move never has an empty piece moved
+
+# move tables for the flat board, built once: squares are numbered row * 8 + col, so a8 is 0 and h1 is 63
+# the first four directions are orthogonal and the last four diagonal, direction d and d ^ 2 are opposite,
+# so d & LINE_MASK is the same for both directions along a line
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, 1), (1, -1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+QUEEN_DIRECTIONS = tuple(range(8))
+SLIDER_DIRECTIONS = {ROOK: ROOK_DIRECTIONS, BISHOP: BISHOP_DIRECTIONS, QUEEN: QUEEN_DIRECTIONS}
+LINE_MASK = 5
+KNIGHT_JUMPS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+
+
+def buildRays():
+    """
+    RAYS[square][direction] is the tuple of squares from square to the edge of the board, nearest first.
+    """
+    rays = []
+    for square in range(64):
+        square_rays = []
+        for d_row, d_col in DIRECTIONS:
+            ray = []
+            row, col = (square >> 3) + d_row, (square & 7) + d_col
+            while 0 <= row <= 7 and 0 <= col <= 7:
+                ray.append(row * 8 + col)
+                row += d_row
+                col += d_col
+            square_rays.append(tuple(ray))
+        rays.append(tuple(square_rays))
+    return tuple(rays)
+
+
+RAYS = buildRays()
+KNIGHT_TARGETS = tuple(tuple((square >> 3) * 8 + d_row * 8 + (square & 7) + d_col for d_row, d_col in KNIGHT_JUMPS
+                             if 0 <= (square >> 3) + d_row <= 7 and 0 <= (square & 7) + d_col <= 7)
+                       for square in range(64))
+KING_TARGETS = tuple(tuple(rays[direction][0] for direction in range(8) if rays[direction]) for rays in RAYS)
+# pawn tables indexed by the color bit of the pawn, 0 for white and BLACK for black
+# pushes hold one square, or two from the starting rank; captures are (square, direction) pairs
+PAWN_PUSHES = {0: tuple(RAYS[square][0][:2 if square >> 3 == 6 else 1] for square in range(64)),
+               BLACK: tuple(RAYS[square][2][:2 if square >> 3 == 1 else 1] for square in range(64))}
+PAWN_CAPTURES = {color: tuple(tuple((RAYS[square][direction][0], direction) for direction in directions
+                                    if RAYS[square][direction])
+                              for square in range(64))
+                 for color, directions in ((0, (4, 5)), (BLACK, (7, 6)))}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+CASTLING_FEN = ((WHITE_KING_SIDE, "K"), (WHITE_QUEEN_SIDE, "Q"), (BLACK_KING_SIDE, "k"), (BLACK_QUEEN_SIDE, "q"))
+# compact snapshot of a position for handing it to another process, its size does not depend on the game length:
+#   64 bytes of piece codes, side to move, castling rights, en-passant square (255 for none), halfmove clock,
+#   ply number, the number of hash keys that follow and then the keys of the positions since the last capture
+#   or pawn move, which is all a repetition check can need
+SNAPSHOT_HEADER = struct.Struct("<64sBBBHHH")
+SNAPSHOT_KEY = struct.Struct("<Q")
+NO_SQUARE = 255
 
 
 class GameState:
@@ -22,8 +221,10 @@ class GameState:
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
-        self.moveFunctions = {"p": self.getPawnMoves, "R": self.getRookMoves, "N": self.getKnightMoves,
-                              "B": self.getBishopMoves, "Q": self.getQueenMoves, "K": self.getKingMoves}
+        # the same position as a flat list of piece codes, the move generators work on this one
+        self.squares = [PIECE_CODES[piece] for row in self.board for piece in row]
+        self.moveFunctions = {PAWN: self.getPawnMoves, ROOK: self.getRookMoves, KNIGHT: self.getKnightMoves,
+                              BISHOP: self.getBishopMoves, QUEEN: self.getQueenMoves, KING: self.getKingMoves}
         self.white_to_move = True
         self.move_log = []
         self.white_king_location = (7, 4)
@@ -31,64 +232,314 @@ class GameState:
         self.checkmate = False
         self.stalemate = False
         self.in_check = False
-        self.pins = []
+        self.pins = {}
         self.checks = []
         self.enpassant_possible = ()  # coordinates for the square where en-passant capture is possible
-        self.enpassant_possible_log = [self.enpassant_possible]
-        self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                               self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.castling_rights = ALL_CASTLING_RIGHTS
+        self.halfmove_clock = 0  # moves since the last capture or pawn move
+        self.zobrist_key = self.computeZobristKey()
+        self.score = self.computeScore()  # material and position in centipawns, positive when white is better
+        self.piece_counts = self.countPieces()  # knights, bishops, rooks and queens of white and of black
+        # the state a move cannot recompute when it is taken back, saved by index so nothing is allocated per move
+        self.undo_stack = [0] * (UNDO_STACK_MOVES * UNDO_RECORD_SIZE)
+        self.start_ply = 0  # plies played before the position the game state was set up from
+        self.previous_keys = []  # hash keys of the positions before that, oldest first
+        self.key_counts = {}  # how often the key of every earlier position of the game occurred, for repetitions
+
+    @classmethod
+    def fromFen(cls, fen):
+        """
+        New game state set up from a FEN string.
+        """
+        game_state = cls()
+        game_state.loadFen(fen)
+        return game_state
+
+    @classmethod
+    def fromSnapshot(cls, snapshot):
+        """
+        New game state set up from the bytes of getSnapshot.
+        """
+        game_state = cls()
+        game_state.loadSnapshot(snapshot)
+        return game_state
+
+    def loadFen(self, fen):
+        """
+        Set up the position of a FEN string, the move log and undo history start over from it.
+        The halfmove clock and move number fields may be left out.
+        """
+        fields = fen.split()
+        board = []
+        for fen_row in fields[0].split("/"):
+            row = []
+            for char in fen_row:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                else:
+                    row.append(("w" if char.isupper() else "b") + (char.upper() if char not in "Pp" else "p"))
+            board.append(row)
+        if len(board) != 8 or any(len(row) != 8 for row in board):
+            raise ValueError("FEN board does not have 8 rows of 8 squares: " + fields[0])
+        castling_rights = 0
+        for right, char in CASTLING_FEN:
+            if char in fields[2]:
+                castling_rights |= right
+        enpassant_possible = ()
+        if fields[3] != "-":
+            enpassant_possible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        white_to_move = fields[1] == "w"
+        self.setPosition(board, white_to_move, castling_rights, enpassant_possible, halfmove_clock,
+                         (fullmove_number - 1) * 2 + (not white_to_move), [])
+
+    def getFen(self):
+        """
+        FEN string of the current position.
+        """
+        fen_rows = []
+        for row in self.board:
+            fen_row = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    fen_row += str(empty)
+                    empty = 0
+                fen_row += piece[1].upper() if piece[0] == "w" else piece[1].lower()
+            fen_rows.append(fen_row + (str(empty) if empty else ""))
+        castling = "".join(char for right, char in CASTLING_FEN if self.castling_rights & right) or "-"
+        enpassant = "-"
+        if self.enpassant_possible:
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        return "%s %s %s %s %d %d" % ("/".join(fen_rows), "w" if self.white_to_move else "b", castling, enpassant,
+                                      self.halfmove_clock, (self.start_ply + len(self.move_log)) // 2 + 1)
+
+    def loadSnapshot(self, snapshot):
+        """
+        Set up the position of the bytes of getSnapshot.
+        """
+        pieces, white_to_move, castling_rights, enpassant_square, halfmove_clock, ply, key_count = \
+            SNAPSHOT_HEADER.unpack_from(snapshot)
+        board = [[PIECE_NAMES[code] for code in pieces[row * 8:row * 8 + 8]] for row in range(8)]
+        enpassant_possible = () if enpassant_square == NO_SQUARE else (enpassant_square >> 3, enpassant_square & 7)
+        previous_keys = [SNAPSHOT_KEY.unpack_from(snapshot, SNAPSHOT_HEADER.size + i * SNAPSHOT_KEY.size)[0]
+                         for i in range(key_count)]
+        self.setPosition(board, bool(white_to_move), castling_rights, enpassant_possible, halfmove_clock, ply,
+                         previous_keys)
+
+    def getSnapshot(self):
+        """
+        The current position packed into bytes for another process to rebuild with fromSnapshot.
+        Unlike pickling the game state it does not grow with the move log.
+        """
+        pieces = bytes(self.squares)
+        enpassant_square = NO_SQUARE
+        if self.enpassant_possible:
+            enpassant_square = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+        keys = self.getKeyHistory()
+        return SNAPSHOT_HEADER.pack(pieces, self.white_to_move, self.castling_rights, enpassant_square,
+                                    min(self.halfmove_clock, 0xFFFF), min(self.start_ply + len(self.move_log), 0xFFFF),
+                                    len(keys)) + b"".join(SNAPSHOT_KEY.pack(key) for key in keys)
+
+    def getKeyHistory(self):
+        """
+        Hash keys of the earlier positions that could still repeat, the ones since the last capture or pawn move.
+        """
+        keys = self.previous_keys + [self.undo_stack[i * UNDO_RECORD_SIZE + UNDO_ZOBRIST_KEY]
+                                     for i in range(len(self.move_log))]
+        return keys[len(keys) - self.halfmove_clock:] if self.halfmove_clock < len(keys) else keys
+
+    def getRepetitions(self):
+        """
+        How many times the current position occurred before in the game.
+        Only positions since the last capture or pawn move can have the same key, the ones before that have other
+        material or pawns, so the counts of the whole game give the same answer as the keys of that window.
+        """
+        return self.key_counts.get(self.zobrist_key, 0)
+
+    def getDrawReason(self):
+        """
+        "threefold repetition" or "fifty-move rule" when the game is drawn by one of them, otherwise None.
+        A move that mates on the hundredth halfmove still wins, call it when the side to move has moves.
+        """
+        if self.getRepetitions() >= 2:
+            return "threefold repetition"
+        if self.halfmove_clock >= 100:
+            return "fifty-move rule"
+        return None
+
+    def setPosition(self, board, white_to_move, castling_rights, enpassant_possible, halfmove_clock, ply,
+                    previous_keys):
+        """
+        Replace the position and everything derived from it, the move log starts over.
+        """
+        self.board = board
+        self.squares = [PIECE_CODES[piece] for row in board for piece in row]
+        self.white_to_move = white_to_move
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] == "wK":
+                    self.white_king_location = (row, col)
+                elif board[row][col] == "bK":
+                    self.black_king_location = (row, col)
+        self.castling_rights = castling_rights
+        self.enpassant_possible = enpassant_possible
+        self.halfmove_clock = halfmove_clock
+        self.start_ply = ply
+        self.previous_keys = previous_keys
+        self.key_counts = {}
+        for key in previous_keys:
+            self.key_counts[key] = self.key_counts.get(key, 0) + 1
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.in_check = False
+        self.pins = {}
+        self.checks = []
+        self.zobrist_key = self.computeZobristKey()
+        self.score = self.computeScore()
+        self.piece_counts = self.countPieces()
+
+    def computeZobristKey(self):
+        """
+        Hash the current position from scratch.
+        makeMove and undoMove keep the key up to date, this is only needed after setting up a position.
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][row * 8 + col]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if self.enpassant_possible:
+            key ^= ZOBRIST_ENPASSANT_FILES[self.enpassant_possible[1]]
+        key ^= ZOBRIST_CASTLING[self.castling_rights]
+        return key
+
+    def computeScore(self):
+        """
+        Material and piece-square score of the current position from scratch, makeMove and undoMove keep it up to date.
+        """
+        return sum(PIECE_SQUARE_SCORES[piece][square] for square, piece in enumerate(self.squares))
+
+    def countPieces(self):
+        """
+        Pieces other than pawns and kings of white and of black, by color bit, from scratch.
+        makeMove and undoMove keep the counts up to date, the search reads them to guard null moves.
+        """
+        counts = [0, 0]
+        for piece in self.squares:
+            if KNIGHT <= piece & PIECE_TYPE_MASK <= QUEEN:
+                counts[piece >> 3] += 1
+        return counts
 
     def makeMove(self, move):
         """
-        Takes a Move as a parameter and executes it.
-        (this will not work for castling, pawn promotion and en-passant)
+        Takes a packed move as a parameter and executes it.
         """
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
+        start_square = move & SQUARE_MASK
+        end_square = move >> END_SHIFT & SQUARE_MASK
+        start_row, start_col = start_square >> 3, start_square & 7
+        end_row, end_col = end_square >> 3, end_square & 7
+        piece_moved = PIECE_NAMES[move >> MOVED_SHIFT & PIECE_MASK]
+        piece_captured = PIECE_NAMES[move >> CAPTURED_SHIFT & PIECE_MASK]
+
+        # save the irreversible state for undoMove
+        index = len(self.move_log) * UNDO_RECORD_SIZE
+        undo_stack = self.undo_stack
+        if index == len(undo_stack):
+            undo_stack.extend([0] * len(undo_stack))
+        undo_stack[index + UNDO_CASTLING_RIGHTS] = self.castling_rights
+        undo_stack[index + UNDO_ENPASSANT] = self.enpassant_possible
+        undo_stack[index + UNDO_HALFMOVE_CLOCK] = self.halfmove_clock
+        undo_stack[index + UNDO_ZOBRIST_KEY] = self.zobrist_key
+        undo_stack[index + UNDO_SCORE] = self.score
+        key_counts = self.key_counts
+        key_counts[self.zobrist_key] = key_counts.get(self.zobrist_key, 0) + 1
+
+        # hash and score out everything the move changes, the new state is hashed in at the end
+        key = self.zobrist_key ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_CASTLING[self.castling_rights]
+        if self.enpassant_possible:
+            key ^= ZOBRIST_ENPASSANT_FILES[self.enpassant_possible[1]]
+        key ^= ZOBRIST_PIECES[piece_moved][start_square]
+        score = self.score - PIECE_SQUARE_SCORES[move >> MOVED_SHIFT & PIECE_MASK][start_square]
+        if piece_captured != "--":
+            captured_square = (start_row if move & ENPASSANT_FLAG else end_row) * 8 + end_col
+            key ^= ZOBRIST_PIECES[piece_captured][captured_square]
+            score -= PIECE_SQUARE_SCORES[move >> CAPTURED_SHIFT & PIECE_MASK][captured_square]
+            if KNIGHT <= move >> CAPTURED_SHIFT & PIECE_TYPE_MASK <= QUEEN:
+                self.piece_counts[move >> CAPTURED_SHIFT + 3 & 1] -= 1
+
+        squares = self.squares
+        self.board[start_row][start_col] = "--"
+        self.board[end_row][end_col] = piece_moved
+        squares[start_square] = 0
+        squares[end_square] = move >> MOVED_SHIFT & PIECE_MASK
         self.move_log.append(move)  # log the move so we can undo it later
         self.white_to_move = not self.white_to_move  # switch players
         # update king's location if moved
-        if move.piece_moved == "wK":
-            self.white_king_location = (move.end_row, move.end_col)
-        elif move.piece_moved == "bK":
-            self.black_king_location = (move.end_row, move.end_col)
+        if piece_moved == "wK":
+            self.white_king_location = (end_row, end_col)
+        elif piece_moved == "bK":
+            self.black_king_location = (end_row, end_col)
 
         # pawn promotion
-        if move.is_pawn_promotion:
-            # if not is_AI:
-            #    promoted_piece = input("Promote to Q, R, B, or N:") #take this to UI later
-            #    self.board[move.end_row][move.end_col] = move.piece_moved[0] + promoted_piece
-            # else:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+        if move & PROMOTION_MASK:
+            self.board[end_row][end_col] = PIECE_NAMES[move >> PROMOTION_SHIFT & PIECE_MASK]
+            squares[end_square] = move >> PROMOTION_SHIFT & PIECE_MASK
+            self.piece_counts[move >> PROMOTION_SHIFT + 3 & 1] += 1
 
         # enpassant move
-        if move.is_enpassant_move:
-            self.board[move.start_row][move.end_col] = "--"  # capturing the pawn
+        if move & ENPASSANT_FLAG:
+            self.board[start_row][end_col] = "--"  # capturing the pawn
+            squares[start_row * 8 + end_col] = 0
 
         # update enpassant_possible variable
-        if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2:  # only on 2 square pawn advance
-            self.enpassant_possible = ((move.start_row + move.end_row) // 2, move.start_col)
+        if piece_moved[1] == "p" and abs(start_row - end_row) == 2:  # only on 2 square pawn advance
+            self.enpassant_possible = ((start_row + end_row) // 2, start_col)
         else:
             self.enpassant_possible = ()
 
         # castle move
-        if move.is_castle_move:
-            if move.end_col - move.start_col == 2:  # king-side castle move
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][
-                    move.end_col + 1]  # moves the rook to its new square
-                self.board[move.end_row][move.end_col + 1] = '--'  # erase old rook
+        if move & CASTLE_FLAG:
+            rook_keys = ZOBRIST_PIECES[piece_moved[0] + "R"]
+            if end_col - start_col == 2:  # king-side castle move
+                self.board[end_row][end_col - 1] = self.board[end_row][end_col + 1]  # moves the rook to its new square
+                self.board[end_row][end_col + 1] = '--'  # erase old rook
+                squares[end_square - 1] = squares[end_square + 1]
+                squares[end_square + 1] = 0
+                key ^= rook_keys[end_square + 1] ^ rook_keys[end_square - 1]
+                rook_scores = PIECE_SQUARE_SCORES[squares[end_square - 1]]
+                score += rook_scores[end_square - 1] - rook_scores[end_square + 1]
             else:  # queen-side castle move
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][
-                    move.end_col - 2]  # moves the rook to its new square
-                self.board[move.end_row][move.end_col - 2] = '--'  # erase old rook
+                self.board[end_row][end_col + 1] = self.board[end_row][end_col - 2]  # moves the rook to its new square
+                self.board[end_row][end_col - 2] = '--'  # erase old rook
+                squares[end_square + 1] = squares[end_square - 2]
+                squares[end_square - 2] = 0
+                key ^= rook_keys[end_square - 2] ^ rook_keys[end_square + 1]
+                rook_scores = PIECE_SQUARE_SCORES[squares[end_square + 1]]
+                score += rook_scores[end_square + 1] - rook_scores[end_square - 2]
 
-        self.enpassant_possible_log.append(self.enpassant_possible)
+        # update castling rights - whenever it is a rook or king move, or a rook is captured
+        self.castling_rights &= CASTLING_RIGHTS_MASKS[start_square] & CASTLING_RIGHTS_MASKS[end_square]
+
+        if piece_moved[1] == "p" or piece_captured != "--":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
 
-        # update castling rights - whenever it is a rook or king move
-        self.updateCastleRights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                   self.current_castling_rights.wqs, self.current_castling_rights.bqs))
+        key ^= ZOBRIST_PIECES[self.board[end_row][end_col]][end_square]
+        key ^= ZOBRIST_CASTLING[self.castling_rights]
+        if self.enpassant_possible:
+            key ^= ZOBRIST_ENPASSANT_FILES[self.enpassant_possible[1]]
+        self.zobrist_key = key
+        self.score = score + PIECE_SQUARE_SCORES[squares[end_square]][end_square]
 
     def undoMove(self):
         """
@@ -96,133 +547,195 @@ class GameState:
         """
         if len(self.move_log) != 0:  # make sure that there is a move to undo
             move = self.move_log.pop()
-            self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            start_square = move & SQUARE_MASK
+            end_square = move >> END_SHIFT & SQUARE_MASK
+            start_row, start_col = start_square >> 3, start_square & 7
+            end_row, end_col = end_square >> 3, end_square & 7
+            piece_moved = PIECE_NAMES[move >> MOVED_SHIFT & PIECE_MASK]
+            piece_captured = PIECE_NAMES[move >> CAPTURED_SHIFT & PIECE_MASK]
+            squares = self.squares
+            self.board[start_row][start_col] = piece_moved
+            self.board[end_row][end_col] = piece_captured
+            squares[start_square] = move >> MOVED_SHIFT & PIECE_MASK
+            squares[end_square] = move >> CAPTURED_SHIFT & PIECE_MASK
             self.white_to_move = not self.white_to_move  # swap players
+            if KNIGHT <= move >> CAPTURED_SHIFT & PIECE_TYPE_MASK <= QUEEN:
+                self.piece_counts[move >> CAPTURED_SHIFT + 3 & 1] += 1
+            if move & PROMOTION_MASK:
+                self.piece_counts[move >> PROMOTION_SHIFT + 3 & 1] -= 1
             # update the king's position if needed
-            if move.piece_moved == "wK":
-                self.white_king_location = (move.start_row, move.start_col)
-            elif move.piece_moved == "bK":
-                self.black_king_location = (move.start_row, move.start_col)
+            if piece_moved == "wK":
+                self.white_king_location = (start_row, start_col)
+            elif piece_moved == "bK":
+                self.black_king_location = (start_row, start_col)
             # undo en passant move
-            if move.is_enpassant_move:
-                self.board[move.end_row][move.end_col] = "--"  # leave landing square blank
-                self.board[move.start_row][move.end_col] = move.piece_captured
+            if move & ENPASSANT_FLAG:
+                self.board[end_row][end_col] = "--"  # leave landing square blank
+                self.board[start_row][end_col] = piece_captured
+                squares[end_square] = 0
+                squares[start_row * 8 + end_col] = move >> CAPTURED_SHIFT & PIECE_MASK
 
-            self.enpassant_possible_log.pop()
-            self.enpassant_possible = self.enpassant_possible_log[-1]
+            # restore the irreversible state saved by makeMove
+            index = len(self.move_log) * UNDO_RECORD_SIZE
+            undo_stack = self.undo_stack
+            self.castling_rights = undo_stack[index + UNDO_CASTLING_RIGHTS]
+            self.enpassant_possible = undo_stack[index + UNDO_ENPASSANT]
+            self.halfmove_clock = undo_stack[index + UNDO_HALFMOVE_CLOCK]
+            self.zobrist_key = undo_stack[index + UNDO_ZOBRIST_KEY]
+            self.score = undo_stack[index + UNDO_SCORE]
+            self.key_counts[self.zobrist_key] -= 1
 
-            # undo castle rights
-            self.castle_rights_log.pop()  # get rid of the new castle rights from the move we are undoing
-            self.current_castling_rights = self.castle_rights_log[
-                -1]  # set the current castle rights to the last one in the list
             # undo the castle move
-            if move.is_castle_move:
-                if move.end_col - move.start_col == 2:  # king-side
-                    self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 1]
-                    self.board[move.end_row][move.end_col - 1] = '--'
+            if move & CASTLE_FLAG:
+                if end_col - start_col == 2:  # king-side
+                    self.board[end_row][end_col + 1] = self.board[end_row][end_col - 1]
+                    self.board[end_row][end_col - 1] = '--'
+                    squares[end_square + 1] = squares[end_square - 1]
+                    squares[end_square - 1] = 0
                 else:  # queen-side
-                    self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
-                    self.board[move.end_row][move.end_col + 1] = '--'
+                    self.board[end_row][end_col - 2] = self.board[end_row][end_col + 1]
+                    self.board[end_row][end_col + 1] = '--'
+                    squares[end_square - 2] = squares[end_square + 1]
+                    squares[end_square + 1] = 0
             self.checkmate = False
             self.stalemate = False
 
-    def updateCastleRights(self, move):
-        """
-        Update the castle rights given the move
-        """
-        if move.piece_captured == "wR":
-            if move.end_col == 0:  # left rook
-                self.current_castling_rights.wqs = False
-            elif move.end_col == 7:  # right rook
-                self.current_castling_rights.wks = False
-        elif move.piece_captured == "bR":
-            if move.end_col == 0:  # left rook
-                self.current_castling_rights.bqs = False
-            elif move.end_col == 7:  # right rook
-                self.current_castling_rights.bks = False
-
-        if move.piece_moved == 'wK':
-            self.current_castling_rights.wqs = False
-            self.current_castling_rights.wks = False
-        elif move.piece_moved == 'bK':
-            self.current_castling_rights.bqs = False
-            self.current_castling_rights.bks = False
-        elif move.piece_moved == 'wR':
-            if move.start_row == 7:
-                if move.start_col == 0:  # left rook
-                    self.current_castling_rights.wqs = False
-                elif move.start_col == 7:  # right rook
-                    self.current_castling_rights.wks = False
-        elif move.piece_moved == 'bR':
-            if move.start_row == 0:
-                if move.start_col == 0:  # left rook
-                    self.current_castling_rights.bqs = False
-                elif move.start_col == 7:  # right rook
-                    self.current_castling_rights.bks = False
+    def makeNullMove(self):
+        """
+        Pass the turn without moving, for null-move pruning in the search. Not legal in check.
+        Only undoNullMove can take it back. The position it passes from does not count for repetitions.
+        """
+        index = len(self.move_log) * UNDO_RECORD_SIZE
+        undo_stack = self.undo_stack
+        if index == len(undo_stack):
+            undo_stack.extend([0] * len(undo_stack))
+        undo_stack[index + UNDO_CASTLING_RIGHTS] = self.castling_rights
+        undo_stack[index + UNDO_ENPASSANT] = self.enpassant_possible
+        undo_stack[index + UNDO_HALFMOVE_CLOCK] = self.halfmove_clock
+        undo_stack[index + UNDO_ZOBRIST_KEY] = self.zobrist_key
+        undo_stack[index + UNDO_SCORE] = self.score
+        key = self.zobrist_key ^ ZOBRIST_BLACK_TO_MOVE
+        if self.enpassant_possible:
+            key ^= ZOBRIST_ENPASSANT_FILES[self.enpassant_possible[1]]
+            self.enpassant_possible = ()
+        self.zobrist_key = key
+        self.halfmove_clock += 1
+        self.move_log.append(NULL_MOVE)
+        self.white_to_move = not self.white_to_move
+
+    def undoNullMove(self):
+        """
+        Take back makeNullMove.
+        """
+        self.move_log.pop()
+        self.white_to_move = not self.white_to_move
+        index = len(self.move_log) * UNDO_RECORD_SIZE
+        undo_stack = self.undo_stack
+        self.enpassant_possible = undo_stack[index + UNDO_ENPASSANT]
+        self.halfmove_clock = undo_stack[index + UNDO_HALFMOVE_CLOCK]
+        self.zobrist_key = undo_stack[index + UNDO_ZOBRIST_KEY]
+        self.checkmate = False
+        self.stalemate = False
 
     def getValidMoves(self):
         """
         All moves considering checks.
         """
-        temp_castle_rights = CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                          self.current_castling_rights.wqs, self.current_castling_rights.bqs)
         # advanced algorithm
         moves = []
         self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
 
         if self.white_to_move:
-            king_row = self.white_king_location[0]
-            king_col = self.white_king_location[1]
+            king_row, king_col = self.white_king_location
         else:
-            king_row = self.black_king_location[0]
-            king_col = self.black_king_location[1]
+            king_row, king_col = self.black_king_location
+        king_square = king_row * 8 + king_col
         if self.in_check:
             if len(self.checks) == 1:  # only 1 check, block the check or move the king
                 moves = self.getAllPossibleMoves()
                 # to block the check you must put a piece into one of the squares between the enemy piece and your king
-                check = self.checks[0]  # check information
-                check_row = check[0]
-                check_col = check[1]
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []  # squares that pieces can move to
-                # if knight, must capture the knight or move your king, other pieces can be blocked
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
+                check_square, check_direction = self.checks[0]
+                # if knight or pawn, must capture it or move your king, other pieces can be blocked
+                if check_direction < 0:
+                    valid_squares = (check_square,)
                 else:
-                    for i in range(1, 8):
-                        valid_square = (king_row + check[2] * i,
-                                        king_col + check[3] * i)  # check[2] and check[3] are the check directions
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[
-                            1] == check_col:  # once you get to piece and check
-                            break
+                    ray = RAYS[king_square][check_direction]
+                    valid_squares = ray[:ray.index(check_square) + 1]
                 # get rid of any moves that don't block check or move king
                 for i in range(len(moves) - 1, -1, -1):  # iterate through the list backwards when removing elements
-                    if moves[i].piece_moved[1] != "K":  # move doesn't move king so it must block or capture
-                        if not (moves[i].end_row,
-                                moves[i].end_col) in valid_squares:  # move doesn't block or capture piece
-                            moves.remove(moves[i])
+                    move = moves[i]
+                    if move >> MOVED_SHIFT & PIECE_TYPE_MASK != KING:  # move doesn't move king so it must block or capture
+                        end_square = move >> END_SHIFT & SQUARE_MASK
+                        if not end_square in valid_squares:  # move doesn't block or capture piece
+                            # en passant captures beside its end square, it can still take a checking pawn
+                            if not (move & ENPASSANT_FLAG and
+                                    (move & SQUARE_MASK & ~7) | (end_square & 7) == check_square):
+                                del moves[i]
             else:  # double check, king has to move
-                self.getKingMoves(king_row, king_col, moves)
+                self.getKingMoves(king_square, moves)
         else:  # not in check - all moves are fine
             moves = self.getAllPossibleMoves()
-            if self.white_to_move:
-                self.getCastleMoves(self.white_king_location[0], self.white_king_location[1], moves)
-            else:
-                self.getCastleMoves(self.black_king_location[0], self.black_king_location[1], moves)
+            self.getCastleMoves(king_row, king_col, moves)
 
         if len(moves) == 0:
-            if self.inCheck():
+            if self.in_check:  # already known from checkForPinsAndChecks, no need to look again
                 self.checkmate = True
             else:
-                # TODO stalemate on repeated moves
                 self.stalemate = True
         else:
             self.checkmate = False
             self.stalemate = False
 
-        self.current_castling_rights = temp_castle_rights
+        return moves
+
+    def getCaptureMoves(self):
+        """
+        Legal captures and promotions only, for the quiescence search at the leaves.
+        In check it returns getValidMoves instead, as the way out of check need not be a capture, and like it sets
+        checkmate when there is none. Out of check it leaves checkmate and stalemate alone, having no captures
+        is not the end of the game.
+        """
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.in_check:
+            return self.getValidMoves()
+        moves = []
+        squares = self.squares
+        pins = self.pins
+        ally_color = 0 if self.white_to_move else BLACK
+        for square in range(64):
+            piece = squares[square]
+            if not piece or piece & BLACK != ally_color:
+                continue
+            piece_type = piece & PIECE_TYPE_MASK
+            moved = square | piece << MOVED_SHIFT
+            if piece_type == PAWN:
+                pawn_moves = []
+                self.getPawnMoves(square, pawn_moves)
+                moves.extend(move for move in pawn_moves if move & CAPTURE_OR_PROMOTION_MASK)
+            elif piece_type == KNIGHT:
+                if square not in pins:
+                    for end_square in KNIGHT_TARGETS[square]:
+                        end_piece = squares[end_square]
+                        if end_piece and end_piece & BLACK != ally_color:
+                            moves.append(moved | end_square << END_SHIFT | end_piece << CAPTURED_SHIFT)
+            elif piece_type == KING:
+                for end_square in KING_TARGETS[square]:
+                    end_piece = squares[end_square]
+                    if end_piece and end_piece & BLACK != ally_color and \
+                            not self.squareUnderAttack(end_square >> 3, end_square & 7):
+                        moves.append(moved | end_square << END_SHIFT | end_piece << CAPTURED_SHIFT)
+            else:  # sliders only capture the first piece on each ray
+                pin_direction = pins.get(square, -1)
+                rays = RAYS[square]
+                for direction in SLIDER_DIRECTIONS[piece_type]:
+                    if pin_direction >= 0 and direction & LINE_MASK != pin_direction & LINE_MASK:
+                        continue
+                    for end_square in rays[direction]:
+                        end_piece = squares[end_square]
+                        if end_piece:
+                            if end_piece & BLACK != ally_color:
+                                moves.append(moved | end_square << END_SHIFT | end_piece << CAPTURED_SHIFT)
+                            break
         return moves
 
     def inCheck(self):
@@ -236,14 +749,42 @@ class GameState:
 
     def squareUnderAttack(self, row, col):
         """
-        Determine if enemy can attack the square row col
+        Determine if enemy can attack the square row col.
+        Looks outward from the square for pawns, knights, kings and along the eight rays, and stops at the first attacker.
+        The king of the side to move never blocks a ray, so the squares it wants to step on can be tested as well.
         """
-        self.white_to_move = not self.white_to_move  # switch to opponent's point of view
-        opponents_moves = self.getAllPossibleMoves()
-        self.white_to_move = not self.white_to_move
-        for move in opponents_moves:
-            if move.end_row == row and move.end_col == col:  # square is under attack
+        square = row * 8 + col
+        squares = self.squares
+        if self.white_to_move:
+            enemy_color = BLACK
+            ally_king = KING
+        else:
+            enemy_color = 0
+            ally_king = BLACK | KING
+        # an enemy pawn attacks the square from where a pawn of ours on it would capture
+        enemy_pawn = enemy_color | PAWN
+        for end_square, direction in PAWN_CAPTURES[enemy_color ^ BLACK][square]:
+            if squares[end_square] == enemy_pawn:
+                return True
+        enemy_knight = enemy_color | KNIGHT
+        for end_square in KNIGHT_TARGETS[square]:
+            if squares[end_square] == enemy_knight:
                 return True
+        enemy_king = enemy_color | KING
+        for end_square in KING_TARGETS[square]:
+            if squares[end_square] == enemy_king:
+                return True
+        # rays, the first piece on a ray blocks the rest of it
+        rays = RAYS[square]
+        for direction in range(8):
+            for end_square in rays[direction]:
+                end_piece = squares[end_square]
+                if end_piece and end_piece != ally_king:
+                    if end_piece & BLACK == enemy_color:
+                        enemy_type = end_piece & PIECE_TYPE_MASK
+                        if enemy_type == QUEEN or enemy_type == (ROOK if direction < 4 else BISHOP):
+                            return True
+                    break
         return False
 
     def getAllPossibleMoves(self):
@@ -251,284 +792,191 @@ class GameState:
         All moves without considering checks.
         """
         moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                turn = self.board[row][col][0]
-                if (turn == "w" and self.white_to_move) or (turn == "b" and not self.white_to_move):
-                    piece = self.board[row][col][1]
-                    self.moveFunctions[piece](row, col, moves)  # calls appropriate move function based on piece type
+        ally_color = 0 if self.white_to_move else BLACK
+        move_functions = self.moveFunctions
+        squares = self.squares
+        for square in range(64):
+            piece = squares[square]
+            if piece and piece & BLACK == ally_color:
+                move_functions[piece & PIECE_TYPE_MASK](square, moves)  # calls appropriate move function based on piece type
         return moves
 
     def checkForPinsAndChecks(self):
-        pins = []  # squares pinned and the direction its pinned from
+        """
+        Look outward from the king of the side to move.
+        Pins map the square of a pinned piece to the direction it is pinned from,
+        checks are (square, direction) of every checking piece, the direction is -1 for knights.
+        """
+        pins = {}  # squares pinned and the direction its pinned from
         checks = []  # squares where enemy is applying a check
         in_check = False
+        squares = self.squares
         if self.white_to_move:
-            enemy_color = "b"
-            ally_color = "w"
-            start_row = self.white_king_location[0]
-            start_col = self.white_king_location[1]
+            ally_color = 0
+            king_row, king_col = self.white_king_location
+            pawn_directions = (4, 5)  # black pawns check from above
         else:
-            enemy_color = "w"
-            ally_color = "b"
-            start_row = self.black_king_location[0]
-            start_col = self.black_king_location[1]
+            ally_color = BLACK
+            king_row, king_col = self.black_king_location
+            pawn_directions = (6, 7)
+        enemy_color = ally_color ^ BLACK
+        king_square = king_row * 8 + king_col
         # check outwards from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            direction = directions[j]
-            possible_pin = ()  # reset possible pins
-            for i in range(1, 8):
-                end_row = start_row + direction[0] * i
-                end_col = start_col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] == ally_color and end_piece[1] != "K":
-                        if possible_pin == ():  # first allied piece could be pinned
-                            possible_pin = (end_row, end_col, direction[0], direction[1])
-                        else:  # 2nd allied piece - no check or pin from this direction
-                            break
-                    elif end_piece[0] == enemy_color:
-                        enemy_type = end_piece[1]
-                        # 5 possibilities in this complex conditional
-                        # 1.) orthogonally away from king and piece is a rook
-                        # 2.) diagonally away from king and piece is a bishop
-                        # 3.) 1 square away diagonally from king and piece is a pawn
-                        # 4.) any direction and piece is a queen
-                        # 5.) any direction 1 square away and piece is a king
-                        if (0 <= j <= 3 and enemy_type == "R") or (4 <= j <= 7 and enemy_type == "B") or (
-                                i == 1 and enemy_type == "p" and (
-                                (enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or (
-                                enemy_type == "Q") or (i == 1 and enemy_type == "K"):
-                            if possible_pin == ():  # no piece blocking, so check
-                                in_check = True
-                                checks.append((end_row, end_col, direction[0], direction[1]))
-                                break
-                            else:  # piece blocking so pin
-                                pins.append(possible_pin)
-                                break
-                        else:  # enemy piece not applying checks
-                            break
-                else:
-                    break  # off board
+        rays = RAYS[king_square]
+        for direction in range(8):
+            possible_pin = -1  # reset possible pins
+            distance = 0
+            for end_square in rays[direction]:
+                distance += 1
+                end_piece = squares[end_square]
+                if not end_piece:
+                    continue
+                if end_piece & BLACK == ally_color:
+                    if possible_pin < 0:  # first allied piece could be pinned
+                        possible_pin = end_square
+                        continue
+                    break  # 2nd allied piece - no check or pin from this direction
+                enemy_type = end_piece & PIECE_TYPE_MASK
+                # 5 possibilities in this complex conditional
+                # 1.) orthogonally away from king and piece is a rook
+                # 2.) diagonally away from king and piece is a bishop
+                # 3.) 1 square away diagonally from king and piece is a pawn
+                # 4.) any direction and piece is a queen
+                # 5.) any direction 1 square away and piece is a king
+                if enemy_type == QUEEN or enemy_type == (ROOK if direction < 4 else BISHOP) or (
+                        distance == 1 and (enemy_type == KING or (
+                        enemy_type == PAWN and direction in pawn_directions))):
+                    if possible_pin < 0:  # no piece blocking, so check
+                        in_check = True
+                        checks.append((end_square, direction))
+                    else:  # piece blocking so pin
+                        pins[possible_pin] = direction
+                break  # enemy piece not applying checks blocks the rest of the ray
         # check for knight checks
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
-        for move in knight_moves:
-            end_row = start_row + move[0]
-            end_col = start_col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == "N":  # enemy knight attacking a king
-                    in_check = True
-                    checks.append((end_row, end_col, move[0], move[1]))
+        enemy_knight = enemy_color | KNIGHT
+        for end_square in KNIGHT_TARGETS[king_square]:
+            if squares[end_square] == enemy_knight:  # enemy knight attacking a king
+                in_check = True
+                checks.append((end_square, -1))
         return in_check, pins, checks
 
-    def getPawnMoves(self, row, col, moves):
+    def getPawnMoves(self, square, moves):
         """
-        Get all the pawn moves for the pawn located at row, col and add the moves to the list.
+        Get all the pawn moves for the pawn on square and add the moves to the list.
         """
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pin_direction = self.pins.get(square, -1)
+        squares = self.squares
+        piece = squares[square]
+        ally_color = piece & BLACK
+        moved = square | piece << MOVED_SHIFT
 
-        if self.white_to_move:
-            move_amount = -1
-            start_row = 6
-            enemy_color = "b"
-            king_row, king_col = self.white_king_location
-        else:
-            move_amount = 1
-            start_row = 1
-            enemy_color = "w"
-            king_row, king_col = self.black_king_location
-
-        if self.board[row + move_amount][col] == "--":  # 1 square pawn advance
-            if not piece_pinned or pin_direction == (move_amount, 0):
-                moves.append(Move((row, col), (row + move_amount, col), self.board))
-                if row == start_row and self.board[row + 2 * move_amount][col] == "--":  # 2 square pawn advance
-                    moves.append(Move((row, col), (row + 2 * move_amount, col), self.board))
-        if col - 1 >= 0:  # capture to the left
-            if not piece_pinned or pin_direction == (move_amount, -1):
-                if self.board[row + move_amount][col - 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col - 1), self.board))
-                if (row + move_amount, col - 1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == row:
-                        if king_col < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, col - 1)
-                            outside_range = range(col + 1, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, col, -1)
-                            outside_range = range(col - 2, -1, -1)
-                        for i in inside_range:
-                            if self.board[row][i] != "--":  # some piece beside en-passant pawn blocks
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[row][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((row, col), (row + move_amount, col - 1), self.board, is_enpassant_move=True))
-        if col + 1 <= 7:  # capture to the right
-            if not piece_pinned or pin_direction == (move_amount, +1):
-                if self.board[row + move_amount][col + 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col + 1), self.board))
-                if (row + move_amount, col + 1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == row:
-                        if king_col < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, col)
-                            outside_range = range(col + 2, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, col + 1, -1)
-                            outside_range = range(col - 1, -1, -1)
-                        for i in inside_range:
-                            if self.board[row][i] != "--":  # some piece beside en-passant pawn blocks
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[row][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((row, col), (row + move_amount, col + 1), self.board, is_enpassant_move=True))
-
-    def getRookMoves(self, row, col, moves):
-        """
-        Get all the rook moves for the rook located at row, col and add the moves to the list.
-        """
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                if self.board[row][col][
-                    1] != "Q":  # can't remove queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
-        enemy_color = "b" if self.white_to_move else "w"
-        for direction in directions:
-            for i in range(1, 8):
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # check for possible moves only in boundaries of the board
-                    if not piece_pinned or pin_direction == direction or pin_direction == (
-                            -direction[0], -direction[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty space is valid
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # capture enemy piece
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
+        # pushes, a pawn pinned on its file can still advance
+        if pin_direction < 0 or pin_direction & LINE_MASK == 0:
+            for end_square in PAWN_PUSHES[ally_color][square]:
+                if squares[end_square]:
                     break
+                appendPawnMove(moves, moved | end_square << END_SHIFT)
+
+        for end_square, direction in PAWN_CAPTURES[ally_color][square]:
+            if pin_direction >= 0 and direction & LINE_MASK != pin_direction & LINE_MASK:
+                continue
+            end_piece = squares[end_square]
+            if end_piece:
+                if end_piece & BLACK != ally_color:
+                    appendPawnMove(moves, moved | end_square << END_SHIFT | end_piece << CAPTURED_SHIFT)
+            elif self.enpassant_possible and end_square == self.enpassant_possible[0] * 8 + self.enpassant_possible[1]:
+                if not self.enpassantExposesKing(square, end_square):
+                    moves.append(moved | end_square << END_SHIFT | (piece ^ BLACK) << CAPTURED_SHIFT | ENPASSANT_FLAG)
+
+    def enpassantExposesKing(self, square, end_square):
+        """
+        Taking both pawns off the rank can open it between the king and an enemy rook or queen.
+        """
+        squares = self.squares
+        ally_color = squares[square] & BLACK
+        king_row, king_col = self.white_king_location if ally_color == 0 else self.black_king_location
+        if king_row != square >> 3:
+            return False
+        captured_square = square & ~7 | end_square & 7
+        enemy_color = ally_color ^ BLACK
+        for ray_square in RAYS[king_row * 8 + king_col][3 if king_col < (square & 7) else 1]:
+            ray_piece = squares[ray_square]
+            if ray_piece and ray_square != square and ray_square != captured_square:
+                return ray_piece == enemy_color | ROOK or ray_piece == enemy_color | QUEEN
+        return False
 
-    def getKnightMoves(self, row, col, moves):
-        """
-        Get all the knight moves for the knight located at row col and add the moves to the list.
-        """
-        piece_pinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
-
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2),
-                        (1, -2))  # up/left up/right right/up right/down down/left down/right left/up left/down
-        ally_color = "w" if self.white_to_move else "b"
-        for move in knight_moves:
-            end_row = row + move[0]
-            end_col = col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                if not piece_pinned:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] != ally_color:  # so its either enemy piece or empty square
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-
-    def getBishopMoves(self, row, col, moves):
-        """
-        Get all the bishop moves for the bishop located at row col and add the moves to the list.
-        """
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1, -1), (-1, 1), (1, 1), (1, -1))  # diagonals: up/left up/right down/right down/left
-        enemy_color = "b" if self.white_to_move else "w"
+    def getSlidingMoves(self, square, directions, moves):
+        """
+        Get the moves along the rays in directions for the rook, bishop or queen on square and add them to the list.
+        A pinned piece only keeps the directions along its pin.
+        """
+        pin_direction = self.pins.get(square, -1)
+        squares = self.squares
+        piece = squares[square]
+        ally_color = piece & BLACK
+        moved = square | piece << MOVED_SHIFT
+        rays = RAYS[square]
         for direction in directions:
-            for i in range(1, 8):
-                end_row = row + direction[0] * i
-                end_col = col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # check if the move is on board
-                    if not piece_pinned or pin_direction == direction or pin_direction == (
-                            -direction[0], -direction[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty space is valid
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # capture enemy piece
-                            moves.append(Move((row, col), (end_row, end_col), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
+            if pin_direction >= 0 and direction & LINE_MASK != pin_direction & LINE_MASK:
+                continue
+            for end_square in rays[direction]:
+                end_piece = squares[end_square]
+                if not end_piece:  # empty space is valid
+                    moves.append(moved | end_square << END_SHIFT)
+                else:
+                    if end_piece & BLACK != ally_color:  # capture enemy piece
+                        moves.append(moved | end_square << END_SHIFT | end_piece << CAPTURED_SHIFT)
                     break
 
-    def getQueenMoves(self, row, col, moves):
-        """
-        Get all the queen moves for the queen located at row col and add the moves to the list.
-        """
-        self.getBishopMoves(row, col, moves)
-        self.getRookMoves(row, col, moves)
-
-    def getKingMoves(self, row, col, moves):
-        """
-        Get all the king moves for the king located at row col and add the moves to the list.
-        """
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        ally_color = "w" if self.white_to_move else "b"
-        for i in range(8):
-            end_row = row + row_moves[i]
-            end_col = col + col_moves[i]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # not an ally piece - empty or enemy
-                    # place king on end square and check for checks
-                    if ally_color == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
-                    in_check, pins, checks = self.checkForPinsAndChecks()
-                    if not in_check:
-                        moves.append(Move((row, col), (end_row, end_col), self.board))
-                    # place king back on original location
-                    if ally_color == "w":
-                        self.white_king_location = (row, col)
-                    else:
-                        self.black_king_location = (row, col)
+    def getRookMoves(self, square, moves):
+        """
+        Get all the rook moves for the rook on square and add the moves to the list.
+        """
+        self.getSlidingMoves(square, ROOK_DIRECTIONS, moves)
+
+    def getKnightMoves(self, square, moves):
+        """
+        Get all the knight moves for the knight on square and add the moves to the list.
+        """
+        if square in self.pins:
+            return  # a pinned knight can never stay on the line of its pin
+        squares = self.squares
+        piece = squares[square]
+        ally_color = piece & BLACK
+        moved = square | piece << MOVED_SHIFT
+        for end_square in KNIGHT_TARGETS[square]:
+            end_piece = squares[end_square]
+            if not end_piece:
+                moves.append(moved | end_square << END_SHIFT)
+            elif end_piece & BLACK != ally_color:  # so its an enemy piece
+                moves.append(moved | end_square << END_SHIFT | end_piece << CAPTURED_SHIFT)
+
+    def getBishopMoves(self, square, moves):
+        """
+        Get all the bishop moves for the bishop on square and add the moves to the list.
+        """
+        self.getSlidingMoves(square, BISHOP_DIRECTIONS, moves)
+
+    def getQueenMoves(self, square, moves):
+        """
+        Get all the queen moves for the queen on square and add the moves to the list.
+        """
+        self.getSlidingMoves(square, QUEEN_DIRECTIONS, moves)
+
+    def getKingMoves(self, square, moves):
+        """
+        Get all the king moves for the king on square and add the moves to the list.
+        """
+        squares = self.squares
+        piece = squares[square]
+        ally_color = piece & BLACK
+        moved = square | piece << MOVED_SHIFT
+        for end_square in KING_TARGETS[square]:
+            end_piece = squares[end_square]
+            if not end_piece or end_piece & BLACK != ally_color:  # not an ally piece - empty or enemy
+                # the king does not block attacks on its own end square, so it can stay where it is
+                if not self.squareUnderAttack(end_square >> 3, end_square & 7):
+                    moves.append(moved | end_square << END_SHIFT | end_piece << CAPTURED_SHIFT)
 
     def getCastleMoves(self, row, col, moves):
         """
@@ -536,30 +984,24 @@ class GameState:
         """
         if self.squareUnderAttack(row, col):
             return  # can't castle while in check
-        if (self.white_to_move and self.current_castling_rights.wks) or (
-                not self.white_to_move and self.current_castling_rights.bks):
+        if self.castling_rights & (WHITE_KING_SIDE if self.white_to_move else BLACK_KING_SIDE):
             self.getKingsideCastleMoves(row, col, moves)
-        if (self.white_to_move and self.current_castling_rights.wqs) or (
-                not self.white_to_move and self.current_castling_rights.bqs):
+        if self.castling_rights & (WHITE_QUEEN_SIDE if self.white_to_move else BLACK_QUEEN_SIDE):
             self.getQueensideCastleMoves(row, col, moves)
 
     def getKingsideCastleMoves(self, row, col, moves):
-        if self.board[row][col + 1] == '--' and self.board[row][col + 2] == '--':
+        square = row * 8 + col
+        squares = self.squares
+        if not squares[square + 1] and not squares[square + 2]:
             if not self.squareUnderAttack(row, col + 1) and not self.squareUnderAttack(row, col + 2):
-                moves.append(Move((row, col), (row, col + 2), self.board, is_castle_move=True))
+                moves.append(square | (square + 2) << END_SHIFT | squares[square] << MOVED_SHIFT | CASTLE_FLAG)
 
     def getQueensideCastleMoves(self, row, col, moves):
-        if self.board[row][col - 1] == '--' and self.board[row][col - 2] == '--' and self.board[row][col - 3] == '--':
+        square = row * 8 + col
+        squares = self.squares
+        if not squares[square - 1] and not squares[square - 2] and not squares[square - 3]:
             if not self.squareUnderAttack(row, col - 1) and not self.squareUnderAttack(row, col - 2):
-                moves.append(Move((row, col), (row, col - 2), self.board, is_castle_move=True))
-
-
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+                moves.append(square | (square - 2) << END_SHIFT | squares[square] << MOVED_SHIFT | CASTLE_FLAG)
 
 
 class Move:
@@ -573,7 +1015,8 @@ class Move:
                      "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
-    def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False):
+    def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False,
+                 promotion_piece="Q"):
         self.start_row = start_square[0]
         self.start_col = start_square[1]
         self.end_row = end_square[0]
@@ -583,6 +1026,7 @@ class Move:
         # pawn promotion
         self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or (
                 self.piece_moved == "bp" and self.end_row == 7)
+        self.promotion_piece = promotion_piece if self.is_pawn_promotion else ""
         # en passant
         self.is_enpassant_move = is_enpassant_move
         if self.is_enpassant_move:
@@ -592,6 +1036,30 @@ class Move:
 
         self.is_capture = self.piece_captured != "--"
         self.moveID = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+        self.packed = packMove(start_square, end_square, board, is_enpassant_move, is_castle_move)
+        if self.is_pawn_promotion:
+            self.packed |= PIECE_CODES[self.piece_moved[0] + promotion_piece] << PROMOTION_SHIFT
+
+    @classmethod
+    def fromPacked(cls, packed):
+        """
+        Build the Move for a packed move, the packed move carries the pieces so no board is needed.
+        """
+        move = cls.__new__(cls)
+        start_square = packed & SQUARE_MASK
+        end_square = packed >> END_SHIFT & SQUARE_MASK
+        move.start_row, move.start_col = start_square >> 3, start_square & 7
+        move.end_row, move.end_col = end_square >> 3, end_square & 7
+        move.piece_moved = PIECE_NAMES[packed >> MOVED_SHIFT & PIECE_MASK]
+        move.piece_captured = PIECE_NAMES[packed >> CAPTURED_SHIFT & PIECE_MASK]
+        move.is_pawn_promotion = packed & PROMOTION_MASK != 0
+        move.promotion_piece = PIECE_NAMES[packed >> PROMOTION_SHIFT & PIECE_MASK][1] if move.is_pawn_promotion else ""
+        move.is_enpassant_move = packed & ENPASSANT_FLAG != 0
+        move.is_castle_move = packed & CASTLE_FLAG != 0
+        move.is_capture = move.piece_captured != "--"
+        move.moveID = move.start_row * 1000 + move.start_col * 100 + move.end_row * 10 + move.end_col
+        move.packed = packed
+        return move
 
     def __eq__(self, other):
         """
@@ -603,7 +1071,7 @@ class Move:
 
     def getChessNotation(self):
         if self.is_pawn_promotion:
-            return self.getRankFile(self.end_row, self.end_col) + "Q"
+            return self.getRankFile(self.end_row, self.end_col) + self.promotion_piece
         if self.is_castle_move:
             if self.end_col == 1:
                 return "0-0-0"
@@ -624,11 +1092,18 @@ class Move:
             else:
                 return self.piece_moved[1] + self.getRankFile(self.end_row, self.end_col)
 
-        # TODO Disambiguating moves
+        # without the position the move cannot be disambiguated, ChessPGN.getSan writes full SAN
 
     def getRankFile(self, row, col):
         return self.cols_to_files[col] + self.rows_to_ranks[row]
 
+    def getUciNotation(self):
+        """
+        The move as UCI writes it: start and end square and a lowercase promotion piece, castling is the king move.
+        """
+        return self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col) + \
+            self.promotion_piece.lower()
+
     def __str__(self):
         if self.is_castle_move:
             return "0-0" if self.end_col == 6 else "0-0-0"
@@ -639,9 +1114,40 @@ class Move:
             if self.is_capture:
                 return self.cols_to_files[self.start_col] + "x" + end_square
             else:
-                return end_square + "Q" if self.is_pawn_promotion else end_square
+                return end_square + self.promotion_piece if self.is_pawn_promotion else end_square
 
         move_string = self.piece_moved[1]
         if self.is_capture:
             move_string += "x"
-        return move_string + end_square
\ No newline at end of file
+        return move_string + end_square
+
+
+def packMove(start_square, end_square, board, is_enpassant_move=False, is_castle_move=False):
+    """
+    Pack a move into a single int, the pieces are read from the board.
+    Pawn moves to the last rank still need a promotion piece, see appendPawnMove.
+    """
+    start_row, start_col = start_square
+    end_row, end_col = end_square
+    piece_moved = board[start_row][start_col]
+    packed = (start_row * 8 + start_col) | (end_row * 8 + end_col) << END_SHIFT | PIECE_CODES[piece_moved] << MOVED_SHIFT
+    if is_enpassant_move:
+        return packed | PIECE_CODES["wp" if piece_moved == "bp" else "bp"] << CAPTURED_SHIFT | ENPASSANT_FLAG
+    packed |= PIECE_CODES[board[end_row][end_col]] << CAPTURED_SHIFT
+    if is_castle_move:
+        packed |= CASTLE_FLAG
+    return packed
+
+
+def appendPawnMove(moves, move):
+    """
+    Add a packed pawn move to the list, a move to the last rank is added once for every promotion piece.
+    The queen goes first, so it is the promotion the GUI picks when it matches a move by its squares.
+    """
+    end_row = (move >> END_SHIFT & SQUARE_MASK) >> 3
+    if end_row == 0 or end_row == 7:
+        color = BLACK if move >> MOVED_SHIFT & BLACK else 0
+        for piece in (QUEEN, ROOK, BISHOP, KNIGHT):
+            moves.append(move | (color | piece) << PROMOTION_SHIFT)
+    else:
+        moves.append(move)
@@ -0,0 +1,230 @@
+"""
+The move generators behind one interface, chosen by name.
+A generator is a game state class with the methods of MoveGenerator: it is set up with loadFen, lists the legal
+moves of the side to move as packed moves (see ChessEngine) with getValidMoves, plays them with makeMove and
+undoMove, answers inCheck and keeps white_to_move and move_log up to date.
+Generators that also have everything in SearchGenerator, like ChessEngine.GameState and its subclasses, can run
+the search, the others can only be perft-tested and benchmarked (see ChessPerft).
+"""
+import ChessBitboard
+import ChessEngine
+import Naive_Algorithm
+from ChessEngine import (SQUARE_MASK, END_SHIFT, MOVED_SHIFT, CAPTURED_SHIFT, PROMOTION_SHIFT, PIECE_CODES,
+                         ENPASSANT_FLAG, CASTLE_FLAG, QUEEN, BLACK)
+
+
+class MoveGenerator:
+    """
+    What ChessPerft and the benchmarks call on a generator. A generator does not have to subclass it,
+    registerGenerator checks that it has every method here and every name in ATTRIBUTES.
+    """
+    ATTRIBUTES = ("white_to_move", "move_log")
+
+    @classmethod
+    def fromFen(cls, fen):
+        game_state = cls()
+        game_state.loadFen(fen)
+        return game_state
+
+    def loadFen(self, fen):
+        raise NotImplementedError
+
+    def getValidMoves(self):
+        raise NotImplementedError
+
+    def makeMove(self, move):
+        raise NotImplementedError
+
+    def undoMove(self):
+        raise NotImplementedError
+
+    def inCheck(self):
+        raise NotImplementedError
+
+
+class SearchGenerator(MoveGenerator):
+    """
+    What the search (see ChessAI) calls and reads on top of MoveGenerator.
+    """
+    ATTRIBUTES = MoveGenerator.ATTRIBUTES + ("in_check", "score", "zobrist_key", "piece_counts", "squares",
+                                             "castling_rights", "enpassant_possible", "halfmove_clock",
+                                             "white_king_location", "black_king_location", "checkmate", "stalemate")
+
+    @classmethod
+    def fromSnapshot(cls, snapshot):
+        raise NotImplementedError
+
+    def getSnapshot(self):
+        raise NotImplementedError
+
+    def getFen(self):
+        raise NotImplementedError
+
+    def getCaptureMoves(self):
+        raise NotImplementedError
+
+    def makeNullMove(self):
+        raise NotImplementedError
+
+    def undoNullMove(self):
+        raise NotImplementedError
+
+    def getRepetitions(self):
+        raise NotImplementedError
+
+    def squareUnderAttack(self, row, col):
+        raise NotImplementedError
+
+
+def getMissing(game_state_class, interface=MoveGenerator):
+    """
+    The names of the interface that game_state_class lacks, methods first. The attributes are looked up on a
+    game state of the starting position, so they are only checked once all the methods are there.
+    """
+    methods = sorted({name for base in interface.__mro__ for name in vars(base)
+                      if not name.startswith("_") and name != "ATTRIBUTES"})
+    missing = [name for name in methods if not callable(getattr(game_state_class, name, None))]
+    if not missing:
+        game_state = game_state_class.fromFen(ChessEngine.START_FEN)
+        missing = [name for name in interface.ATTRIBUTES if not hasattr(game_state, name)]
+    return missing
+
+
+class NaiveGameState(MoveGenerator):
+    """
+    Naive_Algorithm.GameState with the generator interface: packed moves, snake_case fields and 'p' pawns.
+    Its generator only promotes to a queen, so underpromotions are missing from its moves.
+    """
+
+    def __init__(self):
+        self.game_state = Naive_Algorithm.GameState()
+        self.move_log = []
+
+    @property
+    def white_to_move(self):
+        return self.game_state.whiteToMove
+
+    def loadFen(self, fen):
+        fields = fen.split()
+        rights = fields[2]
+        game_state = self.game_state
+        game_state.board = fenBoard(fields[0])
+        game_state.whiteToMove = fields[1] == "w"
+        for row in range(8):
+            for col in range(8):
+                if game_state.board[row][col] == "wK":
+                    game_state.whiteKingLocation = (row, col)
+                elif game_state.board[row][col] == "bK":
+                    game_state.blackKingLocation = (row, col)
+        game_state.currentCastleRight = Naive_Algorithm.CastleRights("K" in rights, "k" in rights,
+                                                                     "Q" in rights, "q" in rights)
+        game_state.castleRightsLog = [Naive_Algorithm.CastleRights("K" in rights, "k" in rights,
+                                                                   "Q" in rights, "q" in rights)]
+        game_state.enpassantPossible = fenSquare(fields[3])
+        game_state.moveLogs = []
+        self.move_log = []
+
+    def getValidMoves(self):
+        return [packNaiveMove(move) for move in self.game_state.getValidMoves()]
+
+    def makeMove(self, move):
+        start = move & SQUARE_MASK
+        end = move >> END_SHIFT & SQUARE_MASK
+        self.game_state.makeMove(Naive_Algorithm.Move((start >> 3, start & 7), (end >> 3, end & 7),
+                                                      self.game_state.board, move & ENPASSANT_FLAG != 0,
+                                                      move & CASTLE_FLAG != 0))
+        self.move_log.append(move)
+
+    def undoMove(self):
+        if self.move_log:
+            self.game_state.undoMove()
+            self.move_log.pop()
+
+    def inCheck(self):
+        return self.game_state.inCheck()
+
+
+def fenBoard(placement):
+    """
+    The Naive_Algorithm board of the piece placement field of a FEN string, it names its pawns 'P'.
+    """
+    board = []
+    for fen_row in placement.split("/"):
+        row = []
+        for char in fen_row:
+            if char.isdigit():
+                row.extend(["--"] * int(char))
+            else:
+                row.append(("w" if char.isupper() else "b") + char.upper())
+        board.append(row)
+    return board
+
+
+def fenSquare(square):
+    if square == "-":
+        return ()
+    return 8 - int(square[1]), ord(square[0]) - ord("a")
+
+
+def naivePieceCode(piece):
+    return PIECE_CODES[piece[0] + "p" if piece[1] == "P" else piece]
+
+
+def packNaiveMove(move):
+    """
+    The packed move of a Naive_Algorithm.Move, the same number ChessEngine gives the move.
+    """
+    moved = naivePieceCode(move.pieceMoved)
+    packed = (move.startRow * 8 + move.startCol | (move.endRow * 8 + move.endCol) << END_SHIFT |
+              moved << MOVED_SHIFT | naivePieceCode(move.pieceCaptured) << CAPTURED_SHIFT)
+    if move.isPawnPromotion:
+        packed |= (moved & BLACK | QUEEN) << PROMOTION_SHIFT
+    if move.isEnpassantMove:
+        packed |= ENPASSANT_FLAG
+    if move.isCastleMove:
+        packed |= CASTLE_FLAG
+    return packed
+
+
+# generator name: game state class
+GENERATORS = {}
+SEARCH_GENERATORS = set()  # names of the generators the search can run on
+
+
+def registerGenerator(name, game_state_class):
+    """
+    Make a generator available by name, to ChessPerft and, if it has the SearchGenerator interface, to the search.
+    Raises TypeError if it lacks part of the MoveGenerator interface.
+    """
+    missing = getMissing(game_state_class)
+    if missing:
+        raise TypeError("the %s move generator has no %s" % (name, ", ".join(missing)))
+    GENERATORS[name] = game_state_class
+    SEARCH_GENERATORS.discard(name)
+    if not getMissing(game_state_class, SearchGenerator):
+        SEARCH_GENERATORS.add(name)
+
+
+def canSearch(name):
+    return name in SEARCH_GENERATORS
+
+
+def getGenerator(name, search=False):
+    """
+    The game state class of a generator. Raises ValueError if there is none of that name,
+    or if search is set and the search cannot run on it.
+    """
+    if name not in GENERATORS:
+        raise ValueError("unknown move generator %s, choose from %s" % (name, ", ".join(sorted(GENERATORS))))
+    if search and not canSearch(name):
+        raise ValueError("the search cannot run on the %s move generator" % name)
+    return GENERATORS[name]
+
+
+registerGenerator("ChessEngine", ChessEngine.GameState)
+registerGenerator("ChessBitboard", ChessBitboard.BitboardGameState)
+registerGenerator("Naive_Algorithm", NaiveGameState)
+
+
+def newGameState(name, fen=ChessEngine.START_FEN):
+    return getGenerator(name).fromFen(fen)
@@ -4,9 +4,8 @@ Handling user input.
 Displaying current GameStatus object.
 """
 import pygame as p
-import ChessEngine, ChessAI
+import ChessEngine, ChessAI, ChessWorker
 import sys
-from multiprocessing import Process, Queue
 
 BOARD_WIDTH = BOARD_HEIGHT = 500
 MOVE_LOG_PANEL_WIDTH = 250
@@ -47,15 +46,16 @@ def main():
     game_over = False
     ai_thinking = False
     move_undone = False
-    move_finder_process = None
     move_log_font = p.font.SysFont("Arial", 14, False, False)
     player_one = True  # if a human is playing white, then this will be True, else False
     player_two = False  # if a hyman is playing white, then this will be True, else False
+    engine = ChessWorker.EngineWorker()  # one engine process for the whole game, it ponders on our turn
 
     while running:
         human_turn = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
         for e in p.event.get():
             if e.type == p.QUIT:
+                engine.quit()
                 p.quit()
                 sys.exit()
             # mouse handler
@@ -73,12 +73,13 @@ def main():
                     if len(player_clicks) == 2 and human_turn:  # after 2nd click
                         move = ChessEngine.Move(player_clicks[0], player_clicks[1], game_state.board)
                         for i in range(len(valid_moves)):
-                            if move == valid_moves[i]:
+                            if move == ChessEngine.Move.fromPacked(valid_moves[i]):
                                 game_state.makeMove(valid_moves[i])
                                 move_made = True
                                 animate = True
                                 square_selected = ()  # reset user clicks
                                 player_clicks = []
+                                break  # promotions share their squares, the first one is the queen
                         if not move_made:
                             player_clicks = [square_selected]
 
@@ -89,9 +90,8 @@ def main():
                     move_made = True
                     animate = False
                     game_over = False
-                    if ai_thinking:
-                        move_finder_process.terminate()
-                        ai_thinking = False
+                    engine.cancel()
+                    ai_thinking = False
                     move_undone = True
                 if e.key == p.K_r:  # reset the game when 'r' is pressed
                     game_state = ChessEngine.GameState()
@@ -101,31 +101,32 @@ def main():
                     move_made = False
                     animate = False
                     game_over = False
-                    if ai_thinking:
-                        move_finder_process.terminate()
-                        ai_thinking = False
+                    engine.cancel()
+                    ai_thinking = False
                     move_undone = True
 
         # AI move finder
         if not game_over and not human_turn and not move_undone:
             if not ai_thinking:
                 ai_thinking = True
-                return_queue = Queue()  # used to pass data between threads
-                move_finder_process = Process(target=ChessAI.findBestMove, args=(game_state, valid_moves, return_queue))
-                move_finder_process.start()
+                engine.play(game_state)  # answers at once if the engine was pondering on the move just played
 
-            if not move_finder_process.is_alive():
-                ai_move = return_queue.get()
+            result = engine.getResult()
+            if result is not None:
+                ai_move = result["move"]
                 if ai_move is None:
                     ai_move = ChessAI.findRandomMove(valid_moves)
                 game_state.makeMove(ai_move)
                 move_made = True
                 animate = True
                 ai_thinking = False
+                human_next = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
+                if human_next and len(result["pv"]) > 1 and result["pv"][0] == ai_move:
+                    engine.ponder(game_state, result["pv"][1])  # think on the reply we expect from the human
 
         if move_made:
             if animate:
-                animateMove(game_state.move_log[-1], screen, game_state.board, clock)
+                animateMove(ChessEngine.Move.fromPacked(game_state.move_log[-1]), screen, game_state.board, clock)
             valid_moves = game_state.getValidMoves()
             move_made = False
             animate = False
@@ -147,6 +148,10 @@ def main():
             game_over = True
             drawEndGameText(screen, "Stalemate")
 
+        elif game_state.getDrawReason() is not None:
+            game_over = True
+            drawEndGameText(screen, "Draw by " + game_state.getDrawReason())
+
         clock.tick(MAX_FPS)
         p.display.flip()
 
@@ -178,7 +183,7 @@ def highlightSquares(screen, game_state, valid_moves, square_selected):
     Highlight square selected and moves for piece selected.
     """
     if (len(game_state.move_log)) > 0:
-        last_move = game_state.move_log[-1]
+        last_move = ChessEngine.Move.fromPacked(game_state.move_log[-1])
         s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
         s.set_alpha(100)
         s.fill(p.Color('green'))
@@ -194,7 +199,7 @@ def highlightSquares(screen, game_state, valid_moves, square_selected):
             screen.blit(s, (col * SQUARE_SIZE, row * SQUARE_SIZE))
             # highlight moves from that square
             s.fill(p.Color('yellow'))
-            for move in valid_moves:
+            for move in map(ChessEngine.Move.fromPacked, valid_moves):
                 if move.start_row == row and move.start_col == col:
                     screen.blit(s, (move.end_col * SQUARE_SIZE, move.end_row * SQUARE_SIZE))
 
@@ -217,7 +222,7 @@ def drawMoveLog(screen, game_state, font):
     """
     move_log_rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
     p.draw.rect(screen, p.Color('black'), move_log_rect)
-    move_log = game_state.move_log
+    move_log = [ChessEngine.Move.fromPacked(move) for move in game_state.move_log]
     move_texts = []
     for i in range(0, len(move_log), 2):
         move_string = str(i // 2 + 1) + '. ' + str(move_log[i]) + " "
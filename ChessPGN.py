@@ -0,0 +1,314 @@
+"""
+Reading and writing games in PGN.
+Games are read one at a time from a file of any size, their SAN moves are resolved against the legal moves
+of the position, and written back with full disambiguation and check marks.
+Running this file replays every game of a PGN file on a process pool to validate it and measure the speed.
+"""
+import argparse
+import collections
+import itertools
+import json
+import multiprocessing
+import re
+import sys
+import time
+
+import ChessEngine
+from ChessEngine import (SQUARE_MASK, END_SHIFT, MOVED_SHIFT, CAPTURED_SHIFT, PROMOTION_SHIFT, PIECE_MASK,
+                         PIECE_TYPE_MASK, PAWN, KING, CASTLE_FLAG)
+
+FILES = "abcdefgh"
+PIECE_LETTERS = " PNBRQK"  # by piece type code, SAN leaves out the P
+SEVEN_TAG_ROSTER = (("Event", "?"), ("Site", "?"), ("Date", "????.??.??"), ("Round", "?"), ("White", "?"),
+                    ("Black", "?"), ("Result", "*"))
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+LINE_LENGTH = 80
+REPLAY_CHUNK = 64  # games sent to a replay worker at a time
+PENDING_CHUNKS = 4  # chunks per replay worker read ahead of the results, so memory stays flat on big files
+
+HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN = re.compile(r"\{[^}]*\}|;[^\n]*|[()]|\$\d+|\d+\.+|1-0|0-1|1/2-1/2|\*|[^\s(){};$]+")
+SAN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+
+
+def squareName(square):
+    return FILES[square & 7] + str(8 - (square >> 3))
+
+
+def getSan(game_state, move, valid_moves=None):
+    """
+    SAN of a legal packed move in the position of game_state, valid_moves are its legal moves if known.
+    """
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    start = move & SQUARE_MASK
+    end = move >> END_SHIFT & SQUARE_MASK
+    piece = move >> MOVED_SHIFT & PIECE_TYPE_MASK
+    capture = "x" if move >> CAPTURED_SHIFT & PIECE_MASK else ""
+    if move & CASTLE_FLAG:
+        san = "O-O" if end & 7 == 6 else "O-O-O"
+    elif piece == PAWN:
+        san = (FILES[start & 7] + capture if capture else "") + squareName(end)
+        promotion = move >> PROMOTION_SHIFT & PIECE_TYPE_MASK
+        if promotion:
+            san += "=" + PIECE_LETTERS[promotion]
+    else:
+        # other pieces of the same kind that can go to the same square
+        rivals = [other & SQUARE_MASK for other in valid_moves
+                  if other >> END_SHIFT & SQUARE_MASK == end and other & SQUARE_MASK != start and
+                  other >> MOVED_SHIFT & PIECE_TYPE_MASK == piece]
+        disambiguation = ""
+        if rivals:
+            if all(rival & 7 != start & 7 for rival in rivals):
+                disambiguation = FILES[start & 7]
+            elif all(rival >> 3 != start >> 3 for rival in rivals):
+                disambiguation = str(8 - (start >> 3))
+            else:
+                disambiguation = squareName(start)
+        san = PIECE_LETTERS[piece] + disambiguation + capture + squareName(end)
+    game_state.makeMove(move)
+    if game_state.inCheck():
+        san += "+" if game_state.getValidMoves() else "#"
+    game_state.undoMove()
+    return san
+
+
+def parseSan(game_state, san, valid_moves=None):
+    """
+    The legal packed move a SAN move stands for in the position of game_state.
+    Check marks and annotations are ignored. Raises ValueError if no move or more than one move matches.
+    """
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(text) == 3 else 2
+        candidates = [move for move in valid_moves
+                      if move & CASTLE_FLAG and (move >> END_SHIFT & SQUARE_MASK) & 7 == end_col]
+    else:
+        match = SAN.match(text)
+        if match is None:
+            raise ValueError("not a SAN move: " + san)
+        letter, from_file, from_rank, end_name, promotion = match.groups()
+        piece = PIECE_LETTERS.index(letter) if letter else PAWN
+        end = (8 - int(end_name[1])) * 8 + FILES.index(end_name[0])
+        promotion = PIECE_LETTERS.index(promotion.upper()) if promotion else 0
+        candidates = []
+        for move in valid_moves:
+            start = move & SQUARE_MASK
+            if move >> END_SHIFT & SQUARE_MASK != end or move >> MOVED_SHIFT & PIECE_TYPE_MASK != piece or \
+                    move & CASTLE_FLAG or move >> PROMOTION_SHIFT & PIECE_TYPE_MASK != promotion:
+                continue
+            if from_file and FILES[start & 7] != from_file:
+                continue
+            if from_rank and str(8 - (start >> 3)) != from_rank:
+                continue
+            candidates.append(move)
+        if piece == KING and not candidates:
+            # some programs write castling as the king move
+            candidates = [move for move in valid_moves if move & CASTLE_FLAG and move >> END_SHIFT & SQUARE_MASK == end]
+    if len(candidates) != 1:
+        raise ValueError(("ambiguous" if candidates else "illegal") + " move " + san)
+    return candidates[0]
+
+
+def readGameTexts(pgn_file):
+    """
+    Generator of (headers, movetext) for every game of an open PGN file, reading one line at a time.
+    """
+    headers = {}
+    movetext = []
+    open_comment = False  # a brace comment runs on to the next line
+    for line in pgn_file:
+        stripped = line.strip()
+        if stripped.startswith("[") and not open_comment:
+            if movetext:
+                yield headers, "".join(movetext)
+                headers = {}
+                movetext = []
+            match = HEADER.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+        elif stripped.startswith("%") and not open_comment:
+            continue  # escaped line
+        elif stripped or movetext:
+            movetext.append(line)
+            if open_comment or "{" in line:
+                for char in line:
+                    if char == "{":
+                        open_comment = True
+                    elif char == "}":
+                        open_comment = False
+                    elif char == ";" and not open_comment:
+                        break  # the rest of the line is a comment, braces in it open nothing
+    if headers or movetext:
+        yield headers, "".join(movetext)
+
+
+def parseMovetext(movetext):
+    """
+    The SAN moves of the main line and the result of a movetext. Comments, variations, NAGs and move numbers
+    are skipped.
+    """
+    moves = []
+    result = "*"
+    variation_depth = 0
+    for token in TOKEN.findall(movetext):
+        if token == "(":
+            variation_depth += 1
+        elif token == ")":
+            variation_depth = max(0, variation_depth - 1)
+        elif variation_depth or token[0] in "{;$" or (token[0].isdigit() and token[-1] == "."):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return moves, result
+
+
+def readGames(pgn_file):
+    """
+    Generator of the games of an open PGN file, one at a time, each a dict of its headers, its SAN moves
+    and its result.
+    """
+    for headers, movetext in readGameTexts(pgn_file):
+        moves, result = parseMovetext(movetext)
+        yield {"headers": headers, "moves": moves, "result": headers.get("Result", result)}
+
+
+def replayGame(game, game_state_class=ChessEngine.GameState):
+    """
+    Play the SAN moves of a game from its start position. Returns the game state after the last move,
+    raises ValueError at the first illegal or ambiguous move.
+    """
+    fen = game["headers"].get("FEN")
+    game_state = game_state_class.fromFen(fen) if fen else game_state_class()
+    for ply, san in enumerate(game["moves"]):
+        try:
+            move = parseSan(game_state, san)
+        except ValueError as error:
+            raise ValueError("ply %d: %s" % (ply + 1, error))
+        game_state.makeMove(move)
+    return game_state
+
+
+def formatGame(moves, headers=None, fen=None):
+    """
+    PGN text of a game given by its packed moves from fen, or the start position.
+    The seven tag roster comes first and is filled with '?' where headers has nothing.
+    """
+    headers = dict(headers or {})
+    if fen is not None:
+        headers["SetUp"] = "1"
+        headers["FEN"] = fen
+    result = headers.get("Result", "*")
+    lines = ['[%s "%s"]' % (name, str(headers.pop(name, default)).replace("\\", "\\\\").replace('"', '\\"'))
+             for name, default in SEVEN_TAG_ROSTER]
+    lines += ['[%s "%s"]' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+              for name, value in headers.items()]
+    lines.append("")
+
+    game_state = ChessEngine.GameState.fromFen(fen) if fen else ChessEngine.GameState()
+    tokens = []
+    for move in moves:
+        ply = game_state.start_ply + len(game_state.move_log)
+        if game_state.white_to_move:
+            tokens.append("%d." % (ply // 2 + 1))
+        elif not tokens:
+            tokens.append("%d..." % (ply // 2 + 1))
+        tokens.append(getSan(game_state, move))
+        game_state.makeMove(move)
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def replayGameTexts(game_texts):
+    """
+    Parse and replay a chunk of (headers, movetext) in a worker of replayFile.
+    Returns the number of games and plies replayed and the errors, with the game's place in its chunk.
+    """
+    games = plies = 0
+    errors = []
+    for index, (headers, movetext) in enumerate(game_texts):
+        moves, result = parseMovetext(movetext)
+        try:
+            replayGame({"headers": headers, "moves": moves, "result": result})
+        except ValueError as error:
+            errors.append((index, str(error)))
+            continue
+        games += 1
+        plies += len(moves)
+    return games, plies, errors
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def replayFile(path, processes=None, max_errors=20):
+    """
+    Validate every game of a PGN file by replaying it, on a pool of processes, one per core by default.
+    Returns the counts, the first errors and the games and plies per second.
+    """
+    start_time = time.perf_counter()
+    games = plies = failed = 0
+    errors = []
+    processes = processes or multiprocessing.cpu_count()
+    with open(path, encoding="utf-8", errors="replace") as pgn_file, multiprocessing.Pool(processes) as pool:
+        # Pool.imap would read the whole file ahead of the workers, only a few chunks are kept in flight
+        chunks = chunked(readGameTexts(pgn_file), REPLAY_CHUNK)
+        pending = collections.deque()
+        chunk_number = 0
+        while True:
+            for chunk in itertools.islice(chunks, processes * PENDING_CHUNKS - len(pending)):
+                pending.append(pool.apply_async(replayGameTexts, (chunk,)))
+            if not pending:
+                break
+            chunk_games, chunk_plies, chunk_errors = pending.popleft().get()
+            games += chunk_games
+            plies += chunk_plies
+            failed += len(chunk_errors)
+            for index, error in chunk_errors[:max_errors - len(errors)]:
+                errors.append({"game": chunk_number * REPLAY_CHUNK + index + 1, "error": error})
+            chunk_number += 1
+    seconds = time.perf_counter() - start_time
+    return {"file": path,
+            "games": games,
+            "plies": plies,
+            "failed": failed,
+            "errors": errors,
+            "seconds": round(seconds, 4),
+            "games_per_second": round(games / seconds, 1) if seconds else 0.0,
+            "plies_per_second": int(plies / seconds) if seconds else 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and replay the games of a PGN file.")
+    parser.add_argument("pgn", help="PGN file to replay")
+    parser.add_argument("--processes", type=int, help="replay processes (default one per core)")
+    args = parser.parse_args()
+
+    report = replayFile(args.pgn, args.processes)
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    print()
+    print("%d games, %d plies in %.2fs, %.1f games/s, %d plies/s, %d failed" % (
+        report["games"], report["plies"], report["seconds"], report["games_per_second"], report["plies_per_second"],
+        report["failed"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
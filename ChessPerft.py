@@ -0,0 +1,189 @@
+"""
+Perft: counting the leaf nodes of the move tree down to a fixed depth.
+Checks the move generators of ChessGenerators against known node counts and against each other,
+and measures how fast they are.
+Running this file plays the standard positions on every generator and prints a JSON report,
+two reports can be diffed to catch regressions between releases.
+"""
+import argparse
+import json
+import sys
+import time
+
+import ChessEngine
+import ChessGenerators
+
+REFERENCE_GENERATOR = "ChessEngine"  # the generator the others must agree with
+
+# known leaf node counts at depth 1, 2, 3, ... for every position
+POSITIONS = [
+    {"name": "start", "fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     "nodes": [20, 400, 8902, 197281, 4865609]},
+    {"name": "kiwipete", "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     "nodes": [48, 2039, 97862, 4085603]},
+    {"name": "rook endgame", "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     "nodes": [14, 191, 2812, 43238, 674624]},
+    {"name": "promotions", "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     "nodes": [6, 264, 9467, 422333]},
+    {"name": "promotion with check", "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     "nodes": [44, 1486, 62379, 2103487]},
+    {"name": "middlegame", "fen": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     "nodes": [46, 2079, 89890, 3894594]},
+    {"name": "en passant pinned on rank", "fen": "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     "nodes": [18, 92, 1670, 10138]},
+    {"name": "en passant discovered check", "fen": "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     "nodes": [15, 126, 1928, 13931]},
+    {"name": "double push discovered check", "fen": "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     "nodes": [13, 102, 1266, 10276]},
+    {"name": "castling through attacks", "fen": "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     "nodes": [26, 1141, 27826, 1274206]},
+    {"name": "castling rights lost by capture", "fen": "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     "nodes": [44, 1494, 50509, 1720476]},
+    {"name": "promotion out of check", "fen": "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     "nodes": [11, 133, 1442, 19174]},
+    {"name": "underpromotion", "fen": "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     "nodes": [6, 27, 273, 1329]},
+    {"name": "self stalemate", "fen": "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     "nodes": [2, 6, 13, 63]},
+    {"name": "stalemate and checkmate", "fen": "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     "nodes": [10, 25, 268, 926]},
+]
+
+
+def moveName(move):
+    return ChessEngine.Move.fromPacked(move).getUciNotation()
+
+
+def perft(game_state, depth):
+    """
+    Number of leaf nodes depth plies below the current position.
+    The moves of the last ply are only counted, not played.
+    """
+    if depth == 0:
+        return 1
+    moves = game_state.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game_state.makeMove(move)
+        nodes += perft(game_state, depth - 1)
+        game_state.undoMove()
+    return nodes
+
+
+def divide(game_state, depth):
+    """
+    Perft split by root move, the first place to look when a count is wrong.
+    """
+    counts = {}
+    for move in game_state.getValidMoves():
+        game_state.makeMove(move)
+        counts[moveName(move)] = perft(game_state, depth - 1)
+        game_state.undoMove()
+    return counts
+
+
+def runPosition(backend, position, depth, with_divide=False):
+    """
+    Perft one position on one generator and time it.
+    """
+    game_state = ChessGenerators.newGameState(backend, position["fen"])
+    root_moves = sorted(map(moveName, game_state.getValidMoves()))
+    start = time.perf_counter()
+    if with_divide:
+        counts = divide(game_state, depth)
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(game_state, depth)
+    seconds = time.perf_counter() - start
+    expected = position["nodes"][depth - 1] if depth <= len(position.get("nodes", [])) else None
+    result = {"backend": backend,
+              "position": position["name"],
+              "fen": position["fen"],
+              "depth": depth,
+              "nodes": nodes,
+              "expected": expected,
+              "correct": None if expected is None else nodes == expected,
+              "seconds": round(seconds, 4),
+              "nps": int(nodes / seconds) if seconds > 0 else 0,
+              "moves": root_moves}
+    if with_divide:
+        result["divide"] = dict(sorted(counts.items()))
+    return result
+
+
+def compareResults(result, reference):
+    """
+    Mark whether a generator's result for a position agrees with the reference generator's: the same root moves,
+    the same node count and, with divide, the same count under every root move.
+    """
+    moves, reference_moves = set(result["moves"]), set(reference["moves"])
+    result["agrees"] = moves == reference_moves and result["nodes"] == reference["nodes"] and \
+        result.get("divide") == reference.get("divide")
+    if moves != reference_moves:
+        result["missing_moves"] = sorted(reference_moves - moves)
+        result["extra_moves"] = sorted(moves - reference_moves)
+    return result["agrees"]
+
+
+def runSuite(backends, positions, depth, with_divide=False, reference=REFERENCE_GENERATOR):
+    """
+    Perft every position on every generator, at depth or the deepest known count if that is less,
+    and check every generator agrees with the reference one position by position.
+    """
+    backends = [reference] + [backend for backend in backends if backend != reference]
+    results = []
+    summary = {}
+    reference_results = []
+    for backend in backends:
+        nodes = seconds = failures = agreements = 0
+        for index, position in enumerate(positions):
+            position_depth = min(depth, len(position["nodes"])) if position.get("nodes") else depth
+            result = runPosition(backend, position, position_depth, with_divide)
+            if backend == reference:
+                reference_results.append(result)
+            agreements += compareResults(result, reference_results[index])
+            results.append(result)
+            nodes += result["nodes"]
+            seconds += result["seconds"]
+            failures += result["correct"] is False
+        summary[backend] = {"nodes": nodes,
+                            "seconds": round(seconds, 4),
+                            "nps": int(nodes / seconds) if seconds > 0 else 0,
+                            "failures": failures,
+                            "agreements": agreements,
+                            "positions": len(positions)}
+    return {"depth": depth, "reference": reference, "results": results, "summary": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and time the leaf nodes of the move generators.")
+    parser.add_argument("--depth", type=int, default=3, help="perft depth (default 3)")
+    parser.add_argument("--backend", action="append", choices=sorted(ChessGenerators.GENERATORS),
+                        help="generator to run, can be repeated (default all)")
+    parser.add_argument("--reference", choices=sorted(ChessGenerators.GENERATORS), default=REFERENCE_GENERATOR,
+                        help="generator the others are compared with, it always runs (default %s)" %
+                             REFERENCE_GENERATOR)
+    parser.add_argument("--fen", help="run this position instead of the standard ones")
+    parser.add_argument("--divide", action="store_true", help="add the node count of every root move")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    positions = [{"name": "custom", "fen": args.fen, "nodes": []}] if args.fen else POSITIONS
+    report = runSuite(args.backend or list(ChessGenerators.GENERATORS), positions, args.depth, args.divide,
+                      args.reference)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    for backend, totals in report["summary"].items():
+        print("%s: %d nodes in %.2fs, %d nodes/s, %d wrong counts, agrees with %s on %d of %d positions" % (
+            backend, totals["nodes"], totals["seconds"], totals["nps"], totals["failures"], report["reference"],
+            totals["agreements"], totals["positions"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+"""
+Endgame tablebases for positions with up to four pieces, kings included, generated on this machine
+by retrograde analysis with the engine's own move generation.
+A table covers one material signature, like KRvK, and holds one byte per position: whether the side to move wins,
+draws or loses, and in how many plies the game ends in mate with best play. The byte of a position is found from
+its piece squares, so a table file is memory-mapped and a probe reads a single byte.
+Castling, en passant and the fifty-move rule are left out, positions with castling rights or an en-passant capture
+are not probed. Three-piece tables take a minute to build, four-piece ones about twenty minutes each on one core.
+Running this file builds tables or probes a position.
+"""
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+
+import ChessEngine
+from ChessEngine import (SQUARE_MASK, END_SHIFT, PROMOTION_SHIFT, PIECE_MASK, PIECE_TYPE_MASK,
+                         CAPTURE_OR_PROMOTION_MASK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, BLACK, RAYS,
+                         KNIGHT_TARGETS, KING_TARGETS, SLIDER_DIRECTIONS)
+
+TABLEBASE_DIRECTORY = "tablebases"  # looked for in the working directory
+EXTENSION = ".tb"
+PIECE_LETTERS = "KQRBNP"  # the order of the pieces of a side, in a signature and in a table index
+PIECE_TYPES = (KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN)
+# a table byte: DRAW, 1 to MAX_PLIES when the side to move mates in that many plies,
+# or LOSS plus the plies when it is mated, LOSS alone is checkmate on the board
+DRAW = 0
+LOSS = 128
+MAX_PLIES = 127
+# while building
+ILLEGAL = 255  # in the counts of moves that stay in the table
+UNKNOWN = 255  # no capture or promotion wins
+BLOCKED = 255  # a capture or promotion draws, the position cannot be lost
+BUILD_CHUNK = 1 << 14  # positions sent to a worker of the first pass at a time
+
+THREE_PIECES = ("KQvK", "KRvK", "KBvK", "KNvK", "KPvK")
+FOUR_PIECES = tuple(["K" + PIECE_LETTERS[first] + PIECE_LETTERS[second] + "vK"
+                     for first in range(1, 6) for second in range(first, 6)] +
+                    ["K" + PIECE_LETTERS[first] + "vK" + PIECE_LETTERS[second]
+                     for first in range(1, 6) for second in range(first, 6)])
+
+
+def getSignature(pieces):
+    """
+    Material signature of piece codes, white first: KRvK is a white king and rook against the black king.
+    """
+    pieces = list(pieces)
+    white = "".join(letter for letter, piece_type in zip(PIECE_LETTERS, PIECE_TYPES) for piece in pieces
+                    if piece == piece_type)
+    black = "".join(letter for letter, piece_type in zip(PIECE_LETTERS, PIECE_TYPES) for piece in pieces
+                    if piece == BLACK | piece_type)
+    return white + "v" + black
+
+
+def parseSignature(signature):
+    """
+    The piece codes of a signature, in the order of its table index. Raises ValueError for a bad signature.
+    """
+    sides = signature.split("v")
+    if len(sides) != 2 or not all(side.startswith("K") and side.count("K") == 1 for side in sides):
+        raise ValueError("not a material signature: " + signature)
+    pieces = []
+    for color, side in zip((0, BLACK), sides):
+        if any(letter not in PIECE_LETTERS for letter in side):
+            raise ValueError("not a material signature: " + signature)
+        pieces += [color | PIECE_TYPES[PIECE_LETTERS.index(letter)]
+                   for letter in sorted(side, key=PIECE_LETTERS.index)]
+    return pieces
+
+
+def mirrorSignature(signature):
+    white, black = signature.split("v")
+    return black + "v" + white
+
+
+def canonicalSignature(signature):
+    """
+    The signature with the stronger side as white, the one tables are built for.
+    """
+    white, black = signature.split("v")
+
+    def strength(side):
+        return len(side), [-PIECE_LETTERS.index(letter) for letter in side]
+
+    return signature if strength(white) >= strength(black) else black + "v" + white
+
+
+def getIndex(squares, white_to_move):
+    index = 0 if white_to_move else 1
+    for square in squares:
+        index = index << 6 | square
+    return index
+
+
+def decodeIndex(index, count):
+    """
+    The piece squares and whether white is to move of a table index of count pieces.
+    """
+    squares = [0] * count
+    for slot in range(count - 1, -1, -1):
+        squares[slot] = index & SQUARE_MASK
+        index >>= 6
+    return squares, index == 0
+
+
+def getResult(value):
+    """
+    (result, plies) of a table byte: 1, 0 or -1 for a win, a draw or a loss of the side to move,
+    and the plies until it mates or is mated.
+    """
+    if value == DRAW:
+        return 0, 0
+    if value < LOSS:
+        return 1, value
+    return -1, value - LOSS
+
+
+class Tablebases:
+    """
+    The tables of a directory, each memory-mapped when it is first probed.
+    """
+
+    def __init__(self, directory=TABLEBASE_DIRECTORY):
+        self.directory = directory
+        names = os.listdir(directory) if directory and os.path.isdir(directory) else []
+        self.signatures = {name[:-len(EXTENSION)] for name in names if name.endswith(EXTENSION)}
+        self.max_pieces = max([len(signature) - 1 for signature in self.signatures] or [0])
+        self.tables = {}  # signature -> (open file, mmap)
+
+    def close(self):
+        for table_file, memory in self.tables.values():
+            memory.close()
+            table_file.close()
+        self.tables = {}
+
+    def getTable(self, signature):
+        if signature not in self.tables:
+            table_file = open(os.path.join(self.directory, signature + EXTENSION), "rb")
+            self.tables[signature] = table_file, mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.tables[signature][1]
+
+    def probePieces(self, pieces, white_to_move):
+        """
+        The table byte of a position given as (piece code, square) pairs, or None without a table for it.
+        A position with the colors the other way round than its table is looked up flipped over.
+        """
+        signature = getSignature(piece for piece, _ in pieces)
+        if signature not in self.signatures:
+            if signature == "KvK":
+                return DRAW
+            signature = mirrorSignature(signature)
+            if signature not in self.signatures:
+                return None
+            pieces = [(piece ^ BLACK, square ^ 56) for piece, square in pieces]
+            white_to_move = not white_to_move
+        order = [(piece & BLACK, PIECE_TYPES.index(piece & PIECE_TYPE_MASK), square) for piece, square in pieces]
+        order.sort()
+        return self.getTable(signature)[getIndex([square for _, _, square in order], white_to_move)]
+
+    def probe(self, game_state):
+        """
+        (result, plies) of the position for the side to move, see getResult, or None when it is not in a table.
+        """
+        squares = game_state.squares
+        if 64 - squares.count(0) > self.max_pieces or game_state.castling_rights:
+            return None
+        if game_state.enpassant_possible:
+            # the square only matters when a pawn beside the one that moved can take it
+            row, col = game_state.enpassant_possible
+            row = 4 if row == 5 else 3
+            pawn = PAWN if game_state.white_to_move else BLACK | PAWN
+            if any(squares[row * 8 + beside] == pawn for beside in (col - 1, col + 1) if 0 <= beside <= 7):
+                return None
+        value = self.probePieces([(piece, square) for square, piece in enumerate(squares) if piece],
+                                 game_state.white_to_move)
+        return None if value is None else getResult(value)
+
+    def getBestMove(self, game_state, valid_moves=None):
+        """
+        The move of valid_moves, or of the legal moves, that wins fastest, draws, or loses slowest,
+        with the (result, plies) it leads to for the side to move. None when the position is not in the tables.
+        """
+        if self.probe(game_state) is None:
+            return None
+        if valid_moves is None:
+            valid_moves = game_state.getValidMoves()
+        best = None
+        for move in valid_moves:
+            game_state.makeMove(move)
+            child = self.probe(game_state)
+            game_state.undoMove()
+            if child is None:
+                return None  # a capture or promotion into a table that was not built
+            result, plies = -child[0], child[1] + 1 if child[0] else 0
+            rank = (result, -plies if result > 0 else plies)
+            if best is None or rank > best[0]:
+                best = rank, move, result, plies
+        return best and best[1:]
+
+
+def getDependencies(signature):
+    """
+    Signatures of the tables a capture or a promotion leads to from the positions of signature.
+    """
+    pieces = parseSignature(signature)
+    dependencies = set()
+    for slot, piece in enumerate(pieces):
+        rest = pieces[:slot] + pieces[slot + 1:]
+        if piece & PIECE_TYPE_MASK != KING and len(rest) > 2:
+            dependencies.add(canonicalSignature(getSignature(rest)))
+        if piece & PIECE_TYPE_MASK == PAWN:
+            for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                dependencies.add(canonicalSignature(getSignature(rest + [piece & BLACK | promotion])))
+    return sorted(dependencies)
+
+
+def analyzePositions(signature, directory, start, stop):
+    """
+    First pass over the positions from index start to stop, in a worker of buildTable.
+    For every position it counts the legal moves that stay in the table, and looks up the ones that leave it,
+    captures and promotions, in the tables they lead to. Returns three byte strings for the positions:
+    the count or ILLEGAL, the fewest plies to a mate through a capture or promotion or UNKNOWN,
+    and the most plies to being mated through one or BLOCKED when one of them draws.
+    """
+    pieces = parseSignature(signature)
+    count = len(pieces)
+    black_king = pieces.index(BLACK | KING)
+    pawns = [slot for slot, piece in enumerate(pieces) if piece & PIECE_TYPE_MASK == PAWN]
+    tablebases = Tablebases(directory)
+    game_state = ChessEngine.GameState()
+    game_state.squares = squares = [0] * 64  # only what the move generators read is set up
+    game_state.castling_rights = 0
+    game_state.enpassant_possible = ()
+    remaining = bytearray([ILLEGAL]) * (stop - start)
+    wins = bytearray([UNKNOWN]) * (stop - start)
+    losses = bytearray(stop - start)
+    for index in range(start, stop):
+        position, white_to_move = decodeIndex(index, count)
+        if len(set(position)) < count or any(position[slot] < 8 or position[slot] >= 56 for slot in pawns):
+            continue
+        for piece, square in zip(pieces, position):
+            squares[square] = piece
+        game_state.white_king_location = divmod(position[0], 8)
+        game_state.black_king_location = divmod(position[black_king], 8)
+        game_state.white_to_move = not white_to_move
+        if not game_state.inCheck():  # the side that just moved cannot be in check
+            game_state.white_to_move = white_to_move
+            moves = game_state.getValidMoves()
+            same = 0
+            win = UNKNOWN
+            loss = BLOCKED if not moves and not game_state.in_check else 0  # stalemate is a draw
+            for move in moves:
+                if not move & CAPTURE_OR_PROMOTION_MASK:
+                    same += 1
+                    continue
+                start_square = move & SQUARE_MASK
+                end_square = move >> END_SHIFT & SQUARE_MASK
+                promotion = move >> PROMOTION_SHIFT & PIECE_MASK
+                child = [(promotion or piece, end_square) if square == start_square else (piece, square)
+                         for piece, square in zip(pieces, position) if square != end_square]
+                value = tablebases.probePieces(child, not white_to_move)
+                if value is None:
+                    raise ValueError("%s needs the table of %s" % (signature, getSignature(piece for piece, _ in child)))
+                if value == DRAW:
+                    loss = BLOCKED
+                elif value < LOSS:
+                    loss = max(loss, value + 1)
+                else:
+                    win = min(win, value - LOSS + 1)
+            remaining[index - start] = same
+            wins[index - start] = win
+            losses[index - start] = loss
+        for square in position:
+            squares[square] = 0
+    tablebases.close()
+    return bytes(remaining), bytes(wins), bytes(losses)
+
+
+def getPredecessors(index, pieces, shifts):
+    """
+    Table indexes of the positions one move before the position of index that reach it without a capture or
+    promotion: a piece of the side that just moved is taken back to a square it could have come from.
+    Some of them may be illegal positions.
+    """
+    count = len(pieces)
+    position, white_to_move = decodeIndex(index, count)
+    occupied = set(position)
+    mover = 0 if not white_to_move else BLACK
+    parent = index ^ 1 << 6 * count  # the other side to move
+    for slot, piece in enumerate(pieces):
+        if piece & BLACK != mover:
+            continue
+        square = position[slot]
+        piece_type = piece & PIECE_TYPE_MASK
+        if piece_type == PAWN:
+            step = 8 if mover == 0 else -8
+            row = square >> 3
+            if (row <= 5 if mover == 0 else row >= 2) and square + step not in occupied:
+                origins = [square + step]
+                if row == (4 if mover == 0 else 3) and square + 2 * step not in occupied:
+                    origins.append(square + 2 * step)
+            else:
+                origins = []
+        elif piece_type == KNIGHT:
+            origins = [origin for origin in KNIGHT_TARGETS[square] if origin not in occupied]
+        elif piece_type == KING:
+            origins = [origin for origin in KING_TARGETS[square] if origin not in occupied]
+        else:
+            origins = []
+            for direction in SLIDER_DIRECTIONS[piece_type]:
+                for origin in RAYS[square][direction]:
+                    if origin in occupied:
+                        break
+                    origins.append(origin)
+        for origin in origins:
+            yield parent + (origin - square << shifts[slot])
+
+
+def buildTable(signature, directory=TABLEBASE_DIRECTORY, processes=None):
+    """
+    Generate the table of signature into directory, the tables it depends on have to be there already.
+    The first pass runs on a pool of processes, one per core by default, then wins and losses are spread
+    backwards from the mates one ply at a time. Returns a report of the table.
+    """
+    start_time = time.perf_counter()
+    pieces = parseSignature(signature)
+    count = len(pieces)
+    size = 2 << 6 * count
+    shifts = [6 * (count - 1 - slot) for slot in range(count)]
+    tasks = [(signature, directory, start, min(start + BUILD_CHUNK, size)) for start in range(0, size, BUILD_CHUNK)]
+    with multiprocessing.Pool(processes or multiprocessing.cpu_count()) as pool:
+        passes = pool.starmap(analyzePositions, tasks)
+    remaining = bytearray(b"".join(part[0] for part in passes))
+    wins = b"".join(part[1] for part in passes)
+    losses = bytearray(b"".join(part[2] for part in passes))
+    del passes
+
+    win_levels = [array("I") for _ in range(MAX_PLIES + 2)]  # positions to mark as won, by plies to the mate
+    loss_levels = [array("I") for _ in range(MAX_PLIES + 2)]
+    for index in range(size):
+        if remaining[index] == ILLEGAL:
+            continue
+        if wins[index] != UNKNOWN:
+            win_levels[wins[index]].append(index)
+        elif remaining[index] == 0 and losses[index] != BLOCKED:
+            loss_levels[losses[index]].append(index)
+    values = bytearray(size)
+    done = bytearray(size)
+    for plies in range(MAX_PLIES + 1):
+        # a position with a move to a lost one is won a ply later
+        for index in loss_levels[plies]:
+            if done[index]:
+                continue
+            done[index] = 1
+            values[index] = LOSS + plies
+            for parent in getPredecessors(index, pieces, shifts):
+                if remaining[parent] != ILLEGAL and not done[parent]:
+                    win_levels[plies + 1].append(parent)
+        # a position is lost when every move leads to a won one, as late as the slowest of them
+        for index in win_levels[plies]:
+            if done[index]:
+                continue
+            done[index] = 1
+            values[index] = plies
+            for parent in getPredecessors(index, pieces, shifts):
+                if remaining[parent] == ILLEGAL or done[parent]:
+                    continue
+                remaining[parent] -= 1
+                losses[parent] = max(losses[parent], plies + 1)
+                if remaining[parent] == 0 and wins[parent] == UNKNOWN and losses[parent] != BLOCKED:
+                    loss_levels[losses[parent]].append(parent)
+    if win_levels[MAX_PLIES + 1] or loss_levels[MAX_PLIES + 1]:
+        raise ValueError("%s has mates longer than %d plies" % (signature, MAX_PLIES))
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, signature + EXTENSION)
+    with open(path + ".tmp", "wb") as table_file:
+        table_file.write(values)
+    os.replace(path + ".tmp", path)
+    legal = size - remaining.count(ILLEGAL)  # counts that went to zero are not ILLEGAL
+    won = sum(1 for value in values if 0 < value < LOSS)
+    lost = done.count(1) - won
+    return {"table": signature,
+            "positions": legal,
+            "wins": won,
+            "draws": legal - won - lost,
+            "losses": lost,
+            "longest_mate": max([value if value < LOSS else value - LOSS for value in set(values)] or [0]),
+            "bytes": size,
+            "seconds": round(time.perf_counter() - start_time, 2)}
+
+
+def buildTables(signatures, directory=TABLEBASE_DIRECTORY, processes=None, rebuild=False):
+    """
+    Generate the tables of signatures and any they depend on that are not in directory yet, smallest first.
+    Returns the reports of the tables built.
+    """
+    order = []
+
+    def add(signature):
+        signature = canonicalSignature(signature)
+        if signature in order:
+            return
+        for dependency in getDependencies(signature):
+            if not os.path.exists(os.path.join(directory, dependency + EXTENSION)):
+                add(dependency)
+        order.append(signature)
+
+    for signature in signatures:
+        parseSignature(signature)
+        if rebuild or not os.path.exists(os.path.join(directory, canonicalSignature(signature) + EXTENSION)):
+            add(signature)
+    reports = []
+    for signature in order:
+        reports.append(buildTable(signature, directory, processes))
+        print("%s: %d positions in %.1fs" % (signature, reports[-1]["positions"], reports[-1]["seconds"]),
+              file=sys.stderr)
+    return reports
+
+
+_opened = {}
+
+
+def openTablebases(directory=TABLEBASE_DIRECTORY):
+    """
+    The Tablebases of a directory, opened once per process and shared by every search in it.
+    """
+    if directory not in _opened:
+        _opened[directory] = Tablebases(directory)
+    return _opened[directory]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases or probe a position.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="generate tables")
+    build.add_argument("signatures", nargs="*", help="material signatures like KQvKR (default every 3 piece one)")
+    build.add_argument("--pieces", type=int, choices=(3, 4), help="every table of 3, or of 3 and 4 pieces")
+    build.add_argument("--directory", default=TABLEBASE_DIRECTORY, help="where the tables go (default %(default)s)")
+    build.add_argument("--processes", type=int, help="processes of the first pass (default one per core)")
+    build.add_argument("--rebuild", action="store_true", help="build tables that already exist again")
+    probe = commands.add_parser("probe", help="look up a position and its best move")
+    probe.add_argument("fen", help="position to look up")
+    probe.add_argument("--directory", default=TABLEBASE_DIRECTORY, help="where the tables are (default %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        signatures = list(args.signatures)
+        if args.pieces or not signatures:
+            signatures += THREE_PIECES + (FOUR_PIECES if args.pieces == 4 else ())
+        report = buildTables(signatures, args.directory, args.processes, args.rebuild)
+    else:
+        tablebases = Tablebases(args.directory)
+        game_state = ChessEngine.GameState.fromFen(args.fen)
+        entry = tablebases.probe(game_state)
+        best = tablebases.getBestMove(game_state)
+        report = {"fen": args.fen,
+                  "found": entry is not None,
+                  "result": entry and ("win", "draw", "loss")[1 - entry[0]],
+                  "plies": entry and entry[1],
+                  "move": best and ChessEngine.Move.fromPacked(best[0]).getUciNotation()}
+        tablebases.close()
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Self-play tournaments between two configurations of the AI, without a GUI.
+Games are played on a process pool, every opening twice with the colors swapped,
+and the report has the results, an Elo estimate with its error bars, games per hour and nodes per second.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import ChessAI
+import ChessEngine
+
+MAX_PLIES = 400  # a game still going after this many plies is a draw
+TABLE_SIZE_MB = 4  # transposition table of each side, a pool runs many games at once
+RANDOM_PLIES = 4  # random moves played from an opening for the pairs of games that have no opening of their own
+RANDOM_OPENING_TRIES = 100  # random move sequences tried before an opening is played without them
+
+# ChessAI constants as they were before any configuration changed them
+DEFAULT_OPTIONS = {name: getattr(ChessAI, name) for name in dir(ChessAI) if name.isupper()}
+
+
+def loadOpenings(path):
+    """
+    FENs, one per line, from a position file. Blank lines and lines starting with # are skipped,
+    and so is anything after the fourth field of an EPD line.
+    """
+    openings = []
+    with open(path) as opening_file:
+        for line in opening_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            if len(fields) < 6 or not fields[4].isdigit():  # EPD, no move counters
+                fields = fields[:4] + ["0", "1"]
+            openings.append(" ".join(fields[:6]))
+    return openings
+
+
+def applyOptions(configuration):
+    """
+    Set the ChessAI constants of a configuration's options, like NULL_MOVE_PRUNING or PIECE_VALUES (the piece
+    values of delta pruning, not of the evaluation), and its evaluation: piece_scores and position_scores for
+    ChessEngine.setEvaluation. Whatever an earlier configuration changed and this one does not is put back.
+    """
+    options = configuration.get("options", {})
+    for name, value in DEFAULT_OPTIONS.items():
+        setattr(ChessAI, name, options.get(name, value))
+    ChessEngine.setEvaluation(configuration.get("piece_scores"), configuration.get("position_scores"))
+
+
+def insufficientMaterial(game_state):
+    """
+    True when neither side can mate: kings alone, or a king and a single bishop or knight against a king.
+    """
+    pieces = [piece & ChessEngine.PIECE_TYPE_MASK for piece in game_state.squares
+              if piece and piece & ChessEngine.PIECE_TYPE_MASK != ChessEngine.KING]
+    return not pieces or (len(pieces) == 1 and pieces[0] in (ChessEngine.BISHOP, ChessEngine.KNIGHT))
+
+
+def adjudicate(game_state, valid_moves, max_plies=MAX_PLIES):
+    """
+    The (result, reason) of a finished game, or None while it goes on. valid_moves are the moves of the position.
+    """
+    if not valid_moves:
+        if game_state.in_check:
+            return ("0-1" if game_state.white_to_move else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    draw_reason = game_state.getDrawReason()
+    if draw_reason is not None:
+        return "1/2-1/2", draw_reason
+    if insufficientMaterial(game_state):
+        return "1/2-1/2", "insufficient material"
+    if len(game_state.move_log) >= max_plies:
+        return "1/2-1/2", "move limit"
+    return None
+
+
+def randomOpening(fen, plies, random_generator):
+    """
+    The FEN after plies random legal moves from fen, the search plays the same game from the same position
+    every time, so pairs of games need positions of their own to be samples worth counting.
+    """
+    for _ in range(RANDOM_OPENING_TRIES):
+        game_state = ChessEngine.GameState.fromFen(fen)
+        for _ in range(plies):
+            valid_moves = game_state.getValidMoves()
+            if not valid_moves:
+                break
+            game_state.makeMove(random_generator.choice(valid_moves))
+        if game_state.getValidMoves():
+            return game_state.getFen()
+    return fen  # every try ended the game, the opening is played as it is
+
+
+def playGame(game_number, fen, white, black, max_plies=MAX_PLIES, stats_path=None):
+    """
+    Play one game between two configurations, in a worker process.
+    A configuration is a dict with a name and optionally move_time, max_depth, the ChessAI constants to change
+    under options, and piece_scores and position_scores for an evaluation of its own.
+    The stats of every search go to stats_path if it is given.
+    """
+    game_state = ChessEngine.GameState.fromFen(fen)
+    configurations = {True: white, False: black}
+    searchers = {True: ChessAI.Searcher(ChessAI.TranspositionTable(TABLE_SIZE_MB), stats_path),
+                 False: ChessAI.Searcher(ChessAI.TranspositionTable(TABLE_SIZE_MB), stats_path)}
+    nodes = {True: 0, False: 0}
+    seconds = {True: 0.0, False: 0.0}
+    while True:
+        valid_moves = game_state.getValidMoves()
+        finished = adjudicate(game_state, valid_moves, max_plies)
+        if finished is not None:
+            break
+        side = game_state.white_to_move
+        configuration = configurations[side]
+        applyOptions(configuration)
+        # set up again for the search, so it is on the configuration's GENERATOR and scored by its evaluation
+        search_state = ChessAI.getGameStateClass().fromSnapshot(game_state.getSnapshot())
+        result = searchers[side].search(search_state, valid_moves, configuration.get("move_time", ChessAI.MOVE_TIME),
+                                        max_depth=configuration.get("max_depth", ChessAI.MAX_DEPTH))
+        nodes[side] += result["nodes"]
+        seconds[side] += result["seconds"]
+        game_state.makeMove(result["move"])
+    result, reason = finished
+    return {"game": game_number,
+            "fen": fen,
+            "white": white["name"],
+            "black": black["name"],
+            "result": result,
+            "reason": reason,
+            "plies": len(game_state.move_log),
+            "moves": [ChessEngine.Move.fromPacked(move).getUciNotation() for move in game_state.move_log],
+            "white_nodes": nodes[True],
+            "black_nodes": nodes[False],
+            "white_seconds": round(seconds[True], 4),
+            "black_seconds": round(seconds[False], 4)}
+
+
+def estimateElo(score, games, deviation):
+    """
+    Elo difference for a score fraction, with its 95% error bars from the standard deviation of the game scores.
+    """
+    def elo(fraction):
+        fraction = min(max(fraction, 1e-6), 1 - 1e-6)
+        return round(-400 * math.log10(1 / fraction - 1), 1) or 0.0  # no negative zero
+
+    margin = 1.96 * deviation / math.sqrt(games) if games else 0.0
+    return elo(score), elo(score - margin), elo(score + margin)
+
+
+def summarize(games, first, second, seconds):
+    """
+    Results from the point of view of the first configuration.
+    """
+    scores = []
+    wins = losses = draws = 0
+    nodes = search_seconds = 0
+    for game in games:
+        first_white = game["white"] == first["name"]
+        if game["result"] == "1/2-1/2":
+            draws += 1
+            scores.append(0.5)
+        elif (game["result"] == "1-0") == first_white:
+            wins += 1
+            scores.append(1.0)
+        else:
+            losses += 1
+            scores.append(0.0)
+        nodes += game["white_nodes"] + game["black_nodes"]
+        search_seconds += game["white_seconds"] + game["black_seconds"]
+    count = len(games)
+    score = sum(scores) / count if count else 0.5
+    deviation = math.sqrt(sum((game_score - score) ** 2 for game_score in scores) / count) if count else 0.0
+    elo, elo_low, elo_high = estimateElo(score, count, deviation)
+    return {"first": first["name"],
+            "second": second["name"],
+            "games": count,
+            "wins": wins,
+            "losses": losses,
+            "draws": draws,
+            "score": round(score, 4),
+            "elo": elo,
+            "elo_low": elo_low,
+            "elo_high": elo_high,
+            "seconds": round(seconds, 2),
+            "games_per_hour": round(count / seconds * 3600, 1) if seconds else 0.0,
+            "nps": int(nodes / search_seconds) if search_seconds else 0}
+
+
+def runTournament(first, second, games, openings=None, processes=None, max_plies=MAX_PLIES, stats_path=None,
+                  random_plies=RANDOM_PLIES):
+    """
+    Play games between two configurations on a pool of processes, one per core by default,
+    each opening twice with the colors swapped. Returns the games and their summary.
+    Once every opening has been played, the next pairs start random_plies random moves from one,
+    the same moves every run, so games are not repeated.
+    """
+    openings = openings or [ChessEngine.START_FEN]
+    if first["name"] == second["name"]:
+        second = dict(second, name=second["name"] + " (2)")
+    tasks = []
+    for game_number in range(games):
+        pair = game_number // 2
+        fen = openings[pair % len(openings)]
+        if pair >= len(openings) and random_plies > 0:
+            fen = randomOpening(fen, random_plies, random.Random(pair))  # seeded by the pair, both games get it
+        white, black = (first, second) if game_number % 2 == 0 else (second, first)
+        tasks.append((game_number, fen, white, black, max_plies, stats_path))
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(processes or multiprocessing.cpu_count()) as pool:
+        results = sorted(pool.starmap(playGame, tasks, chunksize=1), key=lambda game: game["game"])
+    seconds = time.perf_counter() - start_time
+    return {"games": results, "summary": summarize(results, first, second, seconds)}
+
+
+def parseConfiguration(text, name):
+    """
+    A configuration from the command line, as JSON: {"name": ..., "move_time": ..., "max_depth": ..., "options": {...},
+    "piece_scores": {"Q": ..., ...}, "position_scores": {"N": [8 rows of 8], ...}}
+    """
+    configuration = json.loads(text)
+    configuration.setdefault("name", name)
+    return configuration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games between two configurations of the AI.")
+    parser.add_argument("--first", default="{}", help="JSON configuration of the first engine")
+    parser.add_argument("--second", default="{}", help="JSON configuration of the second engine")
+    parser.add_argument("--games", type=int, default=10, help="number of games (default 10)")
+    parser.add_argument("--openings", help="file of starting positions, one FEN or EPD per line")
+    parser.add_argument("--processes", type=int, help="games played at once (default one per core)")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="plies before a game is drawn")
+    parser.add_argument("--random-plies", type=int, default=RANDOM_PLIES,
+                        help="random moves from an opening once every opening has been played, 0 repeats them "
+                             "(default %d)" % RANDOM_PLIES)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--stats", metavar="FILE", help="append the stats of every search to FILE as JSON lines")
+    args = parser.parse_args()
+
+    first = parseConfiguration(args.first, "first")
+    second = parseConfiguration(args.second, "second")
+    openings = loadOpenings(args.openings) if args.openings else None
+    report = runTournament(first, second, args.games, openings, args.processes, args.max_plies, args.stats,
+                           args.random_plies)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    summary = report["summary"]
+    print("%s vs %s: +%d -%d =%d, Elo %+.1f (%+.1f, %+.1f), %.1f games/hour, %d nodes/s" % (
+        summary["first"], summary["second"], summary["wins"], summary["losses"], summary["draws"], summary["elo"],
+        summary["elo_low"], summary["elo_high"], summary["games_per_hour"], summary["nps"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
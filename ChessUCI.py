@@ -0,0 +1,195 @@
+"""
+The engine over the UCI protocol, for tournament managers and analysis GUIs.
+Start it with python -m ChessAI --uci, it needs no pygame or display.
+"""
+import multiprocessing
+import sys
+import threading
+
+import ChessAI
+import ChessBook
+import ChessEngine
+import ChessWorker
+
+ENGINE_NAME = "Automatic Chess Engine"
+ENGINE_AUTHOR = "why-akshat"
+MAX_HASH_MB = 4096
+
+
+class UCIEngine:
+    """
+    Reads UCI commands and answers them. Searches run on a thread of a ChessWorker.EngineServer,
+    so stop, ponderhit and isready are answered while the engine thinks.
+    """
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()  # info lines come from the search thread
+        self.game_state = ChessEngine.GameState()
+        self.server = ChessWorker.EngineServer(self.sendBestMove, report=self.sendInfo)
+        self.request_id = 0
+        self.book_path = ChessBook.BOOK_FILE
+        self.own_book = True
+        self.server.setBook(self.book_path)
+        self.handlers = {"uci": self.uci,
+                         "isready": self.isReady,
+                         "setoption": self.setOption,
+                         "ucinewgame": self.newGame,
+                         "position": self.position,
+                         "go": self.go,
+                         "stop": self.stop,
+                         "ponderhit": self.ponderHit}
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, commands=sys.stdin):
+        for line in commands:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == "quit":
+                break
+            if tokens[0] in self.handlers:
+                self.handlers[tokens[0]](tokens[1:])
+            else:
+                self.send("info string unknown command " + tokens[0])
+        self.server.close()
+
+    def uci(self, tokens):
+        self.send("id name " + ENGINE_NAME)
+        self.send("id author " + ENGINE_AUTHOR)
+        self.send("option name Hash type spin default %d min 1 max %d" % (ChessAI.HASH_SIZE_MB, MAX_HASH_MB))
+        self.send("option name Threads type spin default 1 min 1 max %d" % multiprocessing.cpu_count())
+        self.send("option name Ponder type check default false")
+        self.send("option name OwnBook type check default true")
+        self.send("option name BookFile type string default " + ChessBook.BOOK_FILE)
+        self.send("option name StatsFile type string default <empty>")
+        self.send("uciok")
+
+    def isReady(self, tokens):
+        self.send("readyok")
+
+    def setOption(self, tokens):
+        """
+        setoption name <name> value <value>, the name can have spaces.
+        """
+        if "name" not in tokens or "value" not in tokens:
+            return
+        name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")]).lower()
+        value = " ".join(tokens[tokens.index("value") + 1:])
+        if name == "hash":
+            self.server.setHashSize(max(1, min(int(value), MAX_HASH_MB)))
+        elif name == "threads":
+            self.server.setProcesses(max(1, int(value)))
+        elif name == "ownbook":
+            self.own_book = value.lower() == "true"
+            self.server.setBook(self.book_path if self.own_book else None)
+        elif name == "bookfile":
+            self.book_path = value
+            self.server.setBook(self.book_path if self.own_book else None)
+        elif name == "statsfile":
+            self.server.setStatsFile(value if value and value != "<empty>" else None)
+
+    def newGame(self, tokens):
+        self.stop(tokens)
+        self.server.newGame()
+
+    def position(self, tokens):
+        """
+        position startpos|fen <fen> [moves <move> ...]
+        """
+        moves = tokens.index("moves") if "moves" in tokens else len(tokens)
+        if tokens and tokens[0] == "fen":
+            game_state = ChessEngine.GameState.fromFen(" ".join(tokens[1:moves]))
+        else:
+            game_state = ChessEngine.GameState()
+        for text in tokens[moves + 1:]:
+            move = parseMove(game_state, text)
+            if move is None:
+                self.send("info string illegal move " + text)
+                break
+            game_state.makeMove(move)
+        self.game_state = game_state
+
+    def go(self, tokens):
+        """
+        go [depth N] [movetime MS] [wtime MS btime MS winc MS binc MS] [infinite] [ponder]
+        A bare go searches until stop, like infinite.
+        """
+        limits = {}
+        for name, value in zip(tokens, tokens[1:]):
+            if name in ("depth", "movetime", "wtime", "btime", "winc", "binc"):
+                limits[name] = int(value)
+        white = self.game_state.white_to_move
+        time_left = limits.get("wtime" if white else "btime")
+        time_left = time_left / 1000 if time_left is not None else None
+        increment = limits.get("winc" if white else "binc", 0) / 1000
+        move_time = limits["movetime"] / 1000 if "movetime" in limits else float("inf")
+        max_depth = min(limits.get("depth", ChessAI.MAX_DEPTH), ChessAI.MAX_DEPTH)
+        self.request_id += 1
+        snapshot = self.game_state.getSnapshot()
+        if "infinite" in tokens or "ponder" in tokens or not limits:
+            # the ponder move is already the last move of the position
+            self.server.ponder(self.request_id, snapshot, None, move_time, time_left, increment)
+        else:
+            self.server.go(self.request_id, snapshot, move_time, time_left, increment, max_depth)
+
+    def stop(self, tokens):
+        self.server.stop(self.request_id)
+
+    def ponderHit(self, tokens):
+        self.server.ponderHit(self.request_id)
+
+    def sendInfo(self, result):
+        score = result["score"]
+        plies = ChessAI.matePlies(score)
+        if plies is not None:
+            moves = (plies + 1) // 2  # UCI counts the moves of the engine, negative when it is the one mated
+            score_text = "mate %d" % (moves if score > 0 else -moves)
+        else:
+            score_text = "cp %d" % score
+        milliseconds = int(result["seconds"] * 1000)
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+            result["depth"], score_text, result["nodes"], result["nodes"] * 1000 // max(1, milliseconds),
+            milliseconds, " ".join(map(moveText, result["pv"]))))
+
+    def sendBestMove(self, request_id, result):
+        if request_id != self.request_id:
+            return  # a search that was replaced by a newer one
+        if result["move"] is None:
+            self.send("bestmove 0000")
+        elif len(result["pv"]) > 1 and result["pv"][0] == result["move"]:
+            self.send("bestmove %s ponder %s" % (moveText(result["move"]), moveText(result["pv"][1])))
+        else:
+            self.send("bestmove " + moveText(result["move"]))
+
+
+def moveText(move):
+    return ChessEngine.Move.fromPacked(move).getUciNotation()
+
+
+def parseMove(game_state, text):
+    """
+    The legal packed move written as text in UCI notation, or None.
+    """
+    for move in game_state.getValidMoves():
+        if moveText(move) == text:
+            return move
+    return None
+
+
+def main(generator=None):
+    """
+    Run the engine on stdin and stdout, searching on the named move generator if one is given.
+    """
+    if generator is not None:
+        # python -m ChessAI runs its own copy of ChessAI as __main__, the engine uses the imported one
+        ChessAI.setGenerator(generator)
+    UCIEngine().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+A long-lived engine process for the front-end.
+It keeps its transposition table from one move to the next, can be stopped to return the best move found so far,
+and ponders on the expected reply while the other side is thinking.
+Commands and results go over two queues, tagged with a request id so late results of cancelled searches are dropped.
+"""
+import multiprocessing
+import os
+import threading
+from multiprocessing import Process, Queue
+from queue import Empty
+
+import ChessAI
+import ChessBook
+
+
+class EngineWorker:
+    """
+    The front-end's handle on the engine process.
+    """
+
+    def __init__(self, size_mb=ChessAI.HASH_SIZE_MB, book_path=ChessBook.BOOK_FILE):
+        self.commands = Queue()
+        self.responses = Queue()
+        self.process = Process(target=runEngine, args=(self.commands, self.responses, size_mb, book_path),
+                               daemon=True)
+        self.process.start()
+        self.request_id = 0
+        self.ponder_move = None  # the reply being pondered on, None when not pondering
+        self.busy = False  # a result is awaited
+
+    def search(self, game_state, move_time=ChessAI.MOVE_TIME, time_left=None, increment=0.0):
+        """
+        Start searching the position, the result arrives through getResult.
+        """
+        self.cancel()
+        self.request_id += 1
+        self.busy = True
+        self.commands.put(("go", self.request_id, game_state.getSnapshot(), move_time, time_left, increment))
+
+    def ponder(self, game_state, ponder_move, move_time=ChessAI.MOVE_TIME, time_left=None, increment=0.0):
+        """
+        Search the position after ponder_move without a time limit, until the move is played or not.
+        """
+        self.cancel()
+        self.request_id += 1
+        self.ponder_move = ponder_move
+        self.commands.put(("ponder", self.request_id, game_state.getSnapshot(), ponder_move, move_time, time_left,
+                           increment))
+
+    def play(self, game_state, move_time=ChessAI.MOVE_TIME, time_left=None, increment=0.0):
+        """
+        Get a move for the position: if its last move is the one pondered on, the ponder search carries on
+        with the time for the move, which it has mostly used already. Otherwise a new search starts.
+        """
+        if self.ponder_move is not None and game_state.move_log and game_state.move_log[-1] == self.ponder_move:
+            self.ponder_move = None
+            self.busy = True
+            self.commands.put(("ponderhit", self.request_id))
+        else:
+            self.search(game_state, move_time, time_left, increment)
+
+    def stop(self):
+        """
+        Stop the search, its best move so far still arrives through getResult.
+        """
+        if self.busy:
+            self.commands.put(("stop", self.request_id))
+
+    def cancel(self):
+        """
+        Stop the search or the pondering and forget about its result.
+        """
+        if self.busy or self.ponder_move is not None:
+            self.commands.put(("stop", self.request_id))
+            self.request_id += 1
+        self.busy = False
+        self.ponder_move = None
+
+    def getResult(self):
+        """
+        The result dict of the awaited search if it has arrived, otherwise None. Never blocks.
+        """
+        while self.busy:
+            try:
+                request_id, result = self.responses.get_nowait()
+            except Empty:
+                return None
+            if request_id == self.request_id:
+                self.busy = False
+                return result
+        return None
+
+    def quit(self):
+        self.commands.put(("quit",))
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class EngineServer:
+    """
+    The engine side: runs one search at a time on a thread, so commands are still read while it searches.
+    respond is called with the request id and the result dict of every search that ends,
+    report, if given, with the result so far after every iteration.
+    """
+
+    def __init__(self, respond, size_mb=ChessAI.HASH_SIZE_MB, report=None):
+        self.respond = respond
+        self.report = report
+        self.searcher = ChessAI.Searcher(ChessAI.TranspositionTable(size_mb))
+        self.size_mb = size_mb
+        self.stats_path = None
+        self.processes = 1
+        self.pool = None
+        self.shared_table = None  # the table of the processes of the pool, kept from one move to the next
+        self.book = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = None
+        self.request_id = None
+        self.pondering = False
+        self.ponder_budget = 0.0
+        self.ponder_result = None  # a ponder search that finished before its move was played
+
+    def setHashSize(self, size_mb):
+        self.join()
+        self.size_mb = size_mb
+        self.searcher = ChessAI.Searcher(ChessAI.TranspositionTable(size_mb), self.stats_path)
+        if self.shared_table is not None:
+            self.shared_table.unlink()
+            self.shared_table = ChessAI.SharedTranspositionTable(size_mb)
+
+    def setStatsFile(self, path):
+        """
+        Append the stats of every search to the JSON-lines file at path, None stops it.
+        """
+        self.join()
+        self.stats_path = self.searcher.stats_path = path
+
+    def setProcesses(self, processes):
+        """
+        Search on this many processes, with ChessAI.searchParallel. Pondering and infinite searches stay on one.
+        The processes share one table of the hash size for as long as they run.
+        """
+        self.join()
+        self.closePool()
+        self.processes = processes
+        if processes > 1:
+            self.pool = multiprocessing.Pool(processes)
+            self.shared_table = ChessAI.SharedTranspositionTable(self.size_mb)
+
+    def closePool(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.shared_table is not None:
+            self.shared_table.unlink()
+            self.shared_table = None
+
+    def setBook(self, path):
+        """
+        Play from the opening book at path while the position is in it, None or a missing file plays without one.
+        """
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if path and os.path.exists(path):
+            self.book = ChessBook.OpeningBook(path)
+
+    def newGame(self):
+        self.join()
+        self.searcher.transposition_table.clear()
+        if self.shared_table is not None:
+            self.shared_table.clear()
+
+    def close(self):
+        self.join()
+        self.setBook(None)
+        self.closePool()
+
+    def go(self, request_id, game_snapshot, move_time, time_left, increment, max_depth=ChessAI.MAX_DEPTH):
+        game_state = ChessAI.getGameStateClass().fromSnapshot(game_snapshot)
+        move = self.book.pickMove(game_state) if self.book is not None else None
+        if move is not None:
+            self.join()
+            with self.lock:
+                self.request_id = request_id
+                self.pondering = False
+            self.respond(request_id, {"move": move, "score": 0, "depth": 0, "pv": [move], "nodes": 0,
+                                      "seconds": 0.0, "book": True})
+            return
+        self.startSearch(request_id, game_state, move_time, time_left, increment, max_depth=max_depth)
+
+    def ponder(self, request_id, game_snapshot, ponder_move, move_time, time_left, increment):
+        """
+        Search the position after ponder_move until a ponderhit or a stop, ponder_move None ponders on the
+        position itself. A search that ends before then holds its result back, as it does for an infinite one.
+        """
+        game_state = ChessAI.getGameStateClass().fromSnapshot(game_snapshot)
+        if ponder_move is not None:
+            game_state.makeMove(ponder_move)
+        self.ponder_budget = ChessAI.getMoveTime(time_left, increment, move_time)
+        self.startSearch(request_id, game_state, float("inf"), pondering=True)
+
+    def ponderHit(self, request_id):
+        with self.lock:
+            if request_id != self.request_id or not self.pondering:
+                return
+            self.pondering = False
+            if self.ponder_result is not None:
+                self.respond(request_id, self.ponder_result)
+                self.ponder_result = None
+            else:
+                self.searcher.setBudget(self.ponder_budget)  # pondering so far counts as time spent
+
+    def stop(self, request_id):
+        with self.lock:
+            if request_id != self.request_id:
+                return
+            self.pondering = False
+            if self.ponder_result is not None:
+                self.respond(request_id, self.ponder_result)
+                self.ponder_result = None
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def startSearch(self, request_id, game_state, move_time, time_left=None, increment=0.0, pondering=False,
+                    max_depth=ChessAI.MAX_DEPTH):
+        self.join()
+        with self.lock:
+            self.request_id = request_id
+            self.pondering = pondering
+            self.ponder_result = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.runSearch,
+                                       args=(request_id, game_state, move_time, time_left, increment, max_depth,
+                                             pondering, self.stop_event))
+        self.thread.start()
+
+    def runSearch(self, request_id, game_state, move_time, time_left, increment, max_depth, pondering, stop_event):
+        if self.pool is not None and not pondering:
+            # the workers run to their own time or depth limit, a stop does not reach them
+            result = ChessAI.searchParallel(game_state.getSnapshot(), None, move_time, time_left, increment,
+                                            max_depth, self.processes, self.pool, self.shared_table,
+                                            self.stats_path)
+            if self.report is not None:
+                self.report(result)
+        else:
+            result = self.searcher.search(game_state, move_time=move_time, time_left=time_left, increment=increment,
+                                          max_depth=max_depth, stop_event=stop_event, report=self.report)
+        with self.lock:
+            if self.pondering and request_id == self.request_id:
+                self.ponder_result = result  # held back until the ponder move is played
+            else:
+                self.respond(request_id, result)
+
+    def join(self):
+        """
+        Stop the running search, if any, and wait for it.
+        """
+        if self.thread is not None:
+            with self.lock:
+                self.pondering = False
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+
+def runEngine(commands, responses, size_mb=ChessAI.HASH_SIZE_MB, book_path=None):
+    """
+    The engine process: carry out commands until told to quit.
+    """
+    server = EngineServer(lambda request_id, result: responses.put((request_id, result)), size_mb)
+    server.setBook(book_path)
+    handlers = {"go": server.go, "ponder": server.ponder, "ponderhit": server.ponderHit, "stop": server.stop}
+    while True:
+        command = commands.get()
+        if command[0] == "quit":
+            server.close()
+            return
+        handlers[command[0]](*command[1:])
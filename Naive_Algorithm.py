@@ -55,7 +55,7 @@ class GameState:
                 self.board[move.endRow][move.endCol+1] = '--'   # erase the rook
             else:   # Queen side castle
                 self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]   # moves the rook into its new square
-                self.board[move.endRow][move.endCol21] = '--'   # erase the rook
+                self.board[move.endRow][move.endCol-2] = '--'   # erase the rook
 
 
         # Update castling rights - whenever it is a rook or a king move
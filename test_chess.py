@@ -0,0 +1,102 @@
+"""
+Regression tests for the move generators, the notations, the tablebases and the mate scores of the search.
+Run them with python -m pytest from this directory.
+"""
+import io
+
+import pytest
+
+import ChessAI
+import ChessEngine
+import ChessGenerators
+import ChessPerft
+import ChessPGN
+import ChessTablebase
+import ChessUCI
+
+PERFT_DEPTH = 3
+FENS = [
+    ChessEngine.START_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 12 40",
+]
+KNIGHTS_FEN = "4k3/8/8/8/1N3N2/8/1N6/4K3 w - - 0 1"  # three knights reach d3
+ROOK_MATE_FEN = "6k1/8/5K2/8/8/8/8/7R w - - 0 1"  # Rh2 mates on the next move
+
+
+@pytest.mark.parametrize("backend", ["ChessEngine", "ChessBitboard"])
+@pytest.mark.parametrize("position", ChessPerft.POSITIONS, ids=lambda position: position["name"])
+def testPerft(backend, position):
+    for depth, nodes in enumerate(position["nodes"][:PERFT_DEPTH], 1):
+        game_state = ChessGenerators.newGameState(backend, position["fen"])
+        assert ChessPerft.perft(game_state, depth) == nodes
+        assert game_state.getFen() == ChessEngine.GameState.fromFen(position["fen"]).getFen()
+
+
+@pytest.mark.parametrize("fen", FENS)
+def testFenRoundTrip(fen):
+    assert ChessEngine.GameState.fromFen(fen).getFen() == fen
+
+
+@pytest.mark.parametrize("fen", FENS)
+def testSnapshotRoundTrip(fen):
+    game_state = ChessEngine.GameState.fromFen(fen)
+    for _ in range(2):
+        game_state.makeMove(game_state.getValidMoves()[0])
+    copy = ChessEngine.GameState.fromSnapshot(game_state.getSnapshot())
+    assert copy.getFen() == game_state.getFen()
+    assert copy.zobrist_key == game_state.zobrist_key
+    assert copy.score == game_state.score
+    assert copy.piece_counts == game_state.piece_counts
+    assert copy.getValidMoves() == game_state.getValidMoves()
+
+
+def testSanDisambiguation():
+    game_state = ChessEngine.GameState.fromFen(KNIGHTS_FEN)
+    sans = {}
+    for move in game_state.getValidMoves():
+        if move >> ChessEngine.END_SHIFT & ChessEngine.SQUARE_MASK == 43:  # d3
+            sans[move & ChessEngine.SQUARE_MASK] = ChessPGN.getSan(game_state, move)
+    assert sans == {49: "N2d3", 33: "Nb4d3", 37: "Nfd3"}
+    for start, san in sans.items():
+        assert ChessPGN.parseSan(game_state, san) & ChessEngine.SQUARE_MASK == start
+    with pytest.raises(ValueError):
+        ChessPGN.parseSan(game_state, "Nbd3")  # b2 and b4
+
+
+@pytest.fixture(scope="module")
+def tablebases(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("tablebases"))
+    ChessTablebase.buildTables(["KQvK"], directory, processes=1)
+    tablebases = ChessTablebase.Tablebases(directory)
+    yield tablebases
+    tablebases.close()
+
+
+@pytest.mark.parametrize("fen, expected", [
+    ("7k/8/5KQ1/8/8/8/8/8 w - - 0 1", (1, 1)),  # Qg7 mates
+    ("7k/6Q1/5K2/8/8/8/8/8 b - - 0 1", (-1, 0)),  # mated
+    ("7k/8/6Q1/8/8/8/8/5K2 b - - 0 1", (0, 0)),  # stalemate
+    ("8/8/8/8/8/8/1q6/K1k5 w - - 0 1", (-1, 0)),  # mated, looked up in KQvK with the colors swapped
+])
+def testKqkProbe(tablebases, fen, expected):
+    assert tablebases.probe(ChessEngine.GameState.fromFen(fen)) == expected
+
+
+def testMateDistance(monkeypatch):
+    monkeypatch.setattr(ChessAI, "TABLEBASE_DIRECTORY", None)
+    game_state = ChessEngine.GameState.fromFen(ROOK_MATE_FEN)
+    searcher = ChessAI.Searcher(ChessAI.TranspositionTable(1))
+    for _ in range(2):  # the second search reads its mate scores back from the transposition table
+        result = searcher.search(game_state, move_time=60, max_depth=5)
+        assert result["depth"] == 5
+        assert result["score"] == ChessAI.CHECKMATE - 3
+        assert ChessAI.matePlies(result["score"]) == 3
+    output = io.StringIO()
+    engine = ChessUCI.UCIEngine(output)
+    try:
+        engine.sendInfo(result)
+    finally:
+        engine.server.close()
+    assert " score mate 2 " in output.getvalue()